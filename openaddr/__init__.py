@@ -2,17 +2,20 @@ from __future__ import absolute_import, division, print_function
 import logging; _L = logging.getLogger('openaddr')
 
 from tempfile import mkdtemp, mkstemp
-from os.path import realpath, join, splitext, exists, dirname, abspath, relpath
-from shutil import copy, move, rmtree
+from os.path import join, splitext, exists, dirname, abspath, relpath
+from shutil import move, rmtree
 from os import close, utime, remove
-from urllib.parse import urlparse
 from datetime import datetime, date
 import requests
 
+from .util import prefetch_file
+
 from .cache import (
     CacheResult,
     compare_cache_details,
+    conditional_headers,
     DownloadTask,
+    NotModified,
     URLDownloadTask,
 )
 
@@ -29,6 +32,12 @@ from .conform import (
 with open(join(dirname(__file__), 'VERSION')) as file:
     __version__ = file.read().strip()
 
+_SCHEMA_BY_LAYER = {
+    'addresses': ADDRESSES_SCHEMA,
+    'buildings': BUILDINGS_SCHEMA,
+    'parcels': PARCELS_SCHEMA,
+}
+
 class SourceConfig:
     def __init__(self, source, layer, layersource):
         self.source = source
@@ -42,12 +51,7 @@ class SourceConfig:
                 self.data_source = ds
                 break
 
-        if self.layer == 'addresses':
-            self.SCHEMA = ADDRESSES_SCHEMA
-        elif self.layer == "buildings":
-            self.SCHEMA = BUILDINGS_SCHEMA
-        elif self.layer == 'parcels':
-            self.SCHEMA = PARCELS_SCHEMA
+        self.SCHEMA = _SCHEMA_BY_LAYER.get(self.layer, [])
 
 def cache(source_config, destdir, extras):
     ''' Python wrapper for openaddress-cache.
@@ -59,22 +63,48 @@ def cache(source_config, destdir, extras):
           version: data version as date?
           elapsed: elapsed time as timedelta object
           output: subprocess output as string
+          etag, last_modified: HTTP validators for single-URL sources,
+            passed back in extras on a later run to revalidate the cache
 
         Creates and destroys a subdirectory in destdir.
     '''
     start = datetime.now()
     workdir = mkdtemp(prefix='cache-', dir=destdir)
 
-    source_config.data_source.update(extras)
+    data_source = source_config.data_source
+    data_source.update(extras)
 
-    source_urls = source_config.data_source.get('data')
-    if not isinstance(source_urls, list):
-        source_urls = [source_urls]
+    source_urls = data_source.get('data')
+    if not isinstance(source_urls, (list, tuple)):
+        source_urls = (source_urls, )
 
-    protocol_string = source_config.data_source.get('protocol')
+    protocol_string = data_source.get('protocol')
 
     task = DownloadTask.from_protocol_string(protocol_string, source_config)
-    downloaded_files = task.download(source_urls, workdir, source_config)
+    revalidate = isinstance(task, URLDownloadTask) and len(source_urls) == 1
+
+    if revalidate:
+        task.headers.update(conditional_headers(data_source))
+
+    try:
+        downloaded_files = task.download(source_urls, workdir, source_config)
+    except NotModified:
+        _L.info('Source has not changed since %s was cached', data_source['cache'])
+        rmtree(workdir)
+
+        return CacheResult(data_source['cache'],
+                           data_source['fingerprint'],
+                           data_source.get('version', None),
+                           datetime.now() - start,
+                           data_source.get('etag', None),
+                           data_source.get('last_modified', None))
+
+    # Validators from an earlier run no longer describe the new download
+    data_source.pop('etag', None)
+    data_source.pop('last_modified', None)
+
+    if revalidate:
+        data_source.update(task.validators.get(source_urls[0], {}))
 
     # FIXME: I wrote the download stuff to assume multiple files because
     # sometimes a Shapefile fileset is splayed across multiple files instead
@@ -87,15 +117,17 @@ def cache(source_config, destdir, extras):
     # Find the cached data and hold on to it.
     #
     resultdir = join(destdir, 'cached')
-    source_config.data_source['cache'], source_config.data_source['fingerprint'] \
-        = compare_cache_details(filepath_to_upload, resultdir, source_config.data_source)
+    data_source['cache'], data_source['fingerprint'] \
+        = compare_cache_details(filepath_to_upload, resultdir, data_source)
 
     rmtree(workdir)
 
-    return CacheResult(source_config.data_source.get('cache', None),
-                       source_config.data_source.get('fingerprint', None),
-                       source_config.data_source.get('version', None),
-                       datetime.now() - start)
+    return CacheResult(data_source.get('cache', None),
+                       data_source.get('fingerprint', None),
+                       data_source.get('version', None),
+                       datetime.now() - start,
+                       data_source.get('etag', None),
+                       data_source.get('last_modified', None))
 
 def conform(source_config, destdir, extras):
     ''' Python wrapper for openaddresses-conform.
@@ -112,25 +144,24 @@ def conform(source_config, destdir, extras):
     start = datetime.now()
     workdir = mkdtemp(prefix='conform-', dir=destdir)
 
-    source_config.data_source.update(extras)
-
-    #
-    # The cached data will be a local path.
-    #
-    scheme, _, cache_path, _, _, _ = urlparse(extras.get('cache', ''))
-    if scheme == 'file':
-        copy(cache_path, workdir)
+    data_source = source_config.data_source
+    data_source.update(extras)
 
-    source_urls = source_config.data_source.get('cache')
-    if not isinstance(source_urls, list):
-        source_urls = [source_urls]
+    # The cached data will be a local file:// path, which URLDownloadTask
+    # copies into workdir itself; no separate copy of the cache is needed.
+    source_urls = data_source.get('cache')
+    if not isinstance(source_urls, (list, tuple)):
+        source_urls = (source_urls, )
 
     task1 = URLDownloadTask(source_config.data_source_name)
     downloaded_path = task1.download(source_urls, workdir, source_config)
     _L.info("Downloaded to %s", downloaded_path)
 
-    task2 = DecompressionTask.from_format_string(source_config.data_source.get('compression'))
-    names = elaborate_filenames(source_config.data_source.get('conform', {}).get('file', None))
+    for path in downloaded_path:
+        prefetch_file(path)
+
+    task2 = DecompressionTask.from_format_string(data_source.get('compression'))
+    names = elaborate_filenames(data_source.get('conform', {}).get('file', None))
     decompressed_paths = task2.decompress(downloaded_path, workdir, names)
     _L.info("Decompressed to %d files", len(decompressed_paths))
 
@@ -148,11 +179,11 @@ def conform(source_config, destdir, extras):
 
     if out_path is not None and exists(out_path):
         move(out_path, join(destdir, 'out.geojson'))
-        out_path = realpath(join(destdir, 'out.geojson'))
+        out_path = abspath(join(destdir, 'out.geojson'))
 
     rmtree(workdir)
 
-    return ConformResult(source_config.data_source.get('processed', None),
+    return ConformResult(data_source.get('processed', None),
                          feat_count,
                          out_path,
                          datetime.now() - start)
@@ -4,17 +4,19 @@ import logging; _L = logging.getLogger('openaddr.cache')
 import os
 import errno
 import math
+import mmap
 import mimetypes
 import shutil
 import re
 import csv
+import hashlib
 
 from os import mkdir
-from hashlib import md5
+from hashlib import md5, blake2b, sha256
 from os.path import join, basename, exists, abspath, splitext
 from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 from subprocess import check_output
-from tempfile import mkstemp
 from hashlib import sha1
 from shutil import move
 from shapely.geometry import shape
@@ -22,13 +24,52 @@ from esridump import EsriDumper
 from esridump.errors import EsriDownloadError
 
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import xxhash
+except ImportError:
+    # xxhash is an optional, faster alternative to MD5 for fingerprints
+    xxhash = None
+
+try:
+    import magic
+except ImportError:
+    # python-magic is optional, otherwise content is piped to `file`
+    magic = None
 
 # HTTP timeout in seconds, used in various calls to requests.get() and requests.post()
 _http_timeout = 180
 
-from .conform import GEOM_FIELDNAME
+# Read size in bytes for streamed HTTP response bodies
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+# Most source URLs fetched at once, kept within HTTP_POOL_SIZE
+DOWNLOAD_THREADS = 8
+
+# Write buffer size in bytes for downloaded files
+DOWNLOAD_BUFFER_SIZE = 1 << 20
+
+# Leading bytes of content used to sniff a mime-type
+MIME_SNIFF_SIZE = 8 * 1024
+
+# Files at least this large are fingerprinted from a memory map in one pass
+MMAP_FINGERPRINT_SIZE = 10 * 1024 * 1024
+
+# Read size in bytes for fingerprinting smaller files without hashlib.file_digest()
+FINGERPRINT_CHUNK_SIZE = 1 << 20
+
+from .conform import GEOM_FIELDNAME, is_coordinate
 from . import util
 
+# Number of hosts and of connections per host kept alive between requests
+HTTP_POOL_SIZE = 32
+
+# Shared across downloads so connections to the same host are reused
+_http_session = requests.Session()
+_http_session.mount('http://', HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE))
+_http_session.mount('https://', HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE))
+
 def mkdirsp(path):
     try:
         os.makedirs(path)
@@ -40,12 +81,14 @@ def mkdirsp(path):
 
 def traverse(item):
     "Iterates over nested iterables"
-    if isinstance(item, list):
-        for i in item:
-            for j in traverse(i):
-                yield j
-    else:
-        yield item
+    stack = [item]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            # Reversed so items come off the stack in their original order
+            stack.extend(reversed(item))
+        else:
+            yield item
 
 def request(method, url, **kwargs):
     if urlparse(url).scheme == 'ftp':
@@ -55,30 +98,66 @@ def request(method, url, **kwargs):
 
     try:
         _L.debug("Requesting %s with args %s", url, kwargs.get('params') or kwargs.get('data'))
-        return requests.request(method, url, timeout=_http_timeout, **kwargs)
+        return _http_session.request(method, url, timeout=_http_timeout, **kwargs)
     except requests.exceptions.SSLError as e:
         _L.warning("Retrying %s without SSL verification", url)
-        return requests.request(method, url, timeout=_http_timeout, verify=False, **kwargs)
+        return _http_session.request(method, url, timeout=_http_timeout, verify=False, **kwargs)
 
 class CacheResult:
     cache = None
     fingerprint = None
     version = None
     elapsed = None
+    etag = None
+    last_modified = None
 
-    def __init__(self, cache, fingerprint, version, elapsed):
+    def __init__(self, cache, fingerprint, version, elapsed, etag=None, last_modified=None):
         self.cache = cache
         self.fingerprint = fingerprint
         self.version = version
         self.elapsed = elapsed
+        self.etag = etag
+        self.last_modified = last_modified
 
     @staticmethod
     def empty():
         return CacheResult(None, None, None, None)
 
     def todict(self):
-        return dict(cache=self.cache, fingerprint=self.fingerprint, version=self.version)
+        return dict(cache=self.cache, fingerprint=self.fingerprint, version=self.version,
+                    etag=self.etag, last_modified=self.last_modified)
+
 
+def new_fingerprint(algorithm):
+    ''' Return a new hash object for a fingerprint algorithm name.
+
+        MD5 is the default and the fallback, so existing fingerprints
+        keep matching unless a source asks for something else.
+    '''
+    if algorithm == 'blake2b':
+        # Same 128-bit hex length as MD5
+        return blake2b(digest_size=16)
+    elif algorithm == 'sha256':
+        # Hardware-accelerated on CPUs with SHA extensions, truncated when compared
+        return sha256()
+    elif algorithm == 'xxh128':
+        if xxhash is not None:
+            return xxhash.xxh128()
+        _L.warning('xxhash is not installed, using md5 for fingerprint')
+    elif algorithm != 'md5':
+        raise ValueError('Unknown fingerprint algorithm "{}"'.format(algorithm))
+
+    return md5()
+
+def update_fingerprint(fingerprint, file):
+    ''' Feed the rest of an open binary file to a fingerprint hash object.
+    '''
+    if hasattr(hashlib, 'file_digest'):
+        # Python 3.11+ hashes into a reused buffer without per-chunk objects
+        hashlib.file_digest(file, lambda: fingerprint)
+    else:
+        while chunk := file.read(FINGERPRINT_CHUNK_SIZE):
+            fingerprint.update(chunk)
 
 def compare_cache_details(filepath, resultdir, data):
     ''' Compare cache file with known source data, return cache and fingerprint.
@@ -88,15 +167,21 @@ def compare_cache_details(filepath, resultdir, data):
     if not exists(filepath):
         raise Exception('cached file {} is missing'.format(filepath))
 
-    fingerprint = md5()
+    fingerprint = new_fingerprint(data.get('fingerprint_algo', 'md5'))
 
     with open(filepath, 'rb') as file:
-        while chunk := file.read(8192):
-            fingerprint.update(chunk)
+        if os.fstat(file.fileno()).st_size >= MMAP_FINGERPRINT_SIZE:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                fingerprint.update(mapped)
+        else:
+            update_fingerprint(fingerprint, file)
+
+    # Every algorithm is kept to MD5's 32 hex characters
+    fingerprint_hex = fingerprint.hexdigest()[:32]
 
     # Determine if anything needs to be done at all.
     if urlparse(data.get('cache', '')).scheme == 'http' and 'fingerprint' in data:
-        if fingerprint.hexdigest() == data['fingerprint']:
+        if fingerprint_hex == data['fingerprint']:
             return data['cache'], data['fingerprint']
 
     cache_name = basename(filepath)
@@ -107,11 +192,33 @@ def compare_cache_details(filepath, resultdir, data):
     move(filepath, join(resultdir, cache_name))
     data_cache = 'file://' + join(abspath(resultdir), cache_name)
 
-    return data_cache, fingerprint.hexdigest()
+    return data_cache, fingerprint_hex
+
+def conditional_headers(data):
+    ''' Return HTTP headers asking for source data only if it has changed.
+
+        Only useful when compare_cache_details() could reuse the prior cache.
+    '''
+    if urlparse(data.get('cache', '')).scheme != 'http' or 'fingerprint' not in data:
+        return {}
+
+    headers = {}
+
+    if data.get('etag'):
+        headers['If-None-Match'] = data['etag']
+    if data.get('last_modified'):
+        headers['If-Modified-Since'] = data['last_modified']
+
+    return headers
 
 class DownloadError(Exception):
     pass
 
+class NotModified(Exception):
+    ''' Source data has not changed since the known cache was made.
+    '''
+    pass
+
 
 class DownloadTask(object):
 
@@ -145,100 +252,170 @@ class DownloadTask(object):
     def download(self, source_urls, workdir, source_config):
         raise NotImplementedError()
 
-def guess_url_file_extension(url):
-    ''' Get a filename extension for a URL using various hints.
+mimetypes.add_type('application/x-zip-compressed', '.zip', False)
+mimetypes.add_type('application/vnd.geo+json', '.json', False)
+
+_CONTENT_DISPOSITION_PATTERN = re.compile(r'attachment; filename=("?)(?P<filename>[^;]+)\1', re.I)
+
+def url_file_extension(url):
+    ''' Get a filename extension from a URL alone, or None if it can't be trusted.
     '''
-    scheme, _, path, _, query, _ = urlparse(url)
-    mimetypes.add_type('application/x-zip-compressed', '.zip', False)
-    mimetypes.add_type('application/vnd.geo+json', '.json', False)
+    _, _, path, _, query, _ = urlparse(url)
 
     _, likely_ext = os.path.splitext(path)
     bad_extensions = '', '.cgi', '.php', '.aspx', '.asp', '.do'
 
-    if not query and likely_ext not in bad_extensions:
+    if query or likely_ext in bad_extensions:
+        return None
+
+    #
+    # Trust simple URLs without meaningless filename extensions.
+    #
+    _L.debug(u'URL says "{}" for {}'.format(likely_ext, url))
+    return likely_ext
+
+def read_content_head(chunks):
+    ''' Read enough leading bytes from an iterator of chunks to sniff a mime-type.
+
+        Leaves the rest of the chunks in the iterator.
+    '''
+    content = b''
+
+    for chunk in chunks:
+        content += chunk
+        if len(content) >= MIME_SNIFF_SIZE:
+            break
+
+    return content
+
+def guess_url_file_extension(url):
+    ''' Get a filename extension for a URL using various hints.
+    '''
+    path_ext = url_file_extension(url)
+
+    if path_ext is not None:
+        return path_ext
+
+    #
+    # Get a dictionary of headers and a few bytes of content from the URL.
+    #
+    scheme, _, path, _, _, _ = urlparse(url)
+
+    if scheme in ('http', 'https'):
+        response = request('GET', url, stream=True)
+        content = read_content_head(response.iter_content(chunk_size=MIME_SNIFF_SIZE))
+        response.close()
+
+        return guess_content_file_extension(url, response.headers, content)
+
+    elif scheme in ('file', ''):
+        with open(path, 'rb') as file:
+            return guess_content_file_extension(url, dict(), file.read(MIME_SNIFF_SIZE))
+
+    raise ValueError('Unknown scheme "{}": {}'.format(scheme, url))
+
+def guess_content_file_extension(url, headers, content):
+    ''' Get a filename extension for URL content from its headers and leading bytes.
+    '''
+    path_ext = False
+
+    # Guess path extension from Content-Type header
+    if 'content-type' in headers:
+        content_type = headers['content-type'].split(';')[0]
+        _L.debug('Content-Type says "{}" for {}'.format(content_type, url))
+        path_ext = mimetypes.guess_extension(content_type, False)
+
         #
-        # Trust simple URLs without meaningless filename extensions.
+        # Uh-oh, see if Content-Disposition disagrees with Content-Type.
+        # Socrata recently started using Content-Disposition instead
+        # of normal response headers so it's no longer easy to identify
+        # file type.
         #
-        _L.debug(u'URL says "{}" for {}'.format(likely_ext, url))
-        path_ext = likely_ext
+        if 'content-disposition' in headers:
+            match = _CONTENT_DISPOSITION_PATTERN.match(headers['content-disposition'])
+            if match:
+                _, attachment_ext = splitext(match.group('filename'))
+                if path_ext == attachment_ext:
+                    _L.debug('Content-Disposition agrees: "{}"'.format(match.group('filename')))
+                else:
+                    _L.debug('Content-Disposition disagrees: "{}" says we should use "{}", using "{}" instead'.format(
+                        match.group('filename'),
+                        attachment_ext,
+                        path_ext,
+                    ))
 
-    else:
+    if not path_ext:
         #
-        # Get a dictionary of headers and a few bytes of content from the URL.
+        # Headers didn't clearly define a known extension.
+        # Instead, use libmagic to peek at the content.
         #
-        if scheme in ('http', 'https'):
-            response = request('GET', url, stream=True)
-            handle, file = mkstemp()
+        mime_type = get_buffer_mimetype(content[:MIME_SNIFF_SIZE])
+        _L.debug('file says "{}" for {}'.format(mime_type, url))
+        path_ext = mimetypes.guess_extension(mime_type, False)
 
-            for chunk in response.iter_content(chunk_size=8192):
-                os.write(handle, chunk)
+    return path_ext
 
-            os.close(handle)
+def get_buffer_mimetype(content):
+    ''' Get a mime-type for a short length of file content.
+    '''
+    if magic is not None:
+        return magic.from_buffer(content, mime=True)
 
-            content_path = file
-            headers = response.headers
-            response.close()
+    mime_type = check_output(('file', '--mime-type', '-b', '-'), input=content).strip()
 
-        elif scheme in ('file', ''):
-            headers = dict()
-            content_path = path
-        else:
-            raise ValueError('Unknown scheme "{}": {}'.format(scheme, url))
-
-        path_ext = False
-
-        # Guess path extension from Content-Type header
-        if 'content-type' in headers:
-            content_type = headers['content-type'].split(';')[0]
-            _L.debug('Content-Type says "{}" for {}'.format(content_type, url))
-            path_ext = mimetypes.guess_extension(content_type, False)
-
-            #
-            # Uh-oh, see if Content-Disposition disagrees with Content-Type.
-            # Socrata recently started using Content-Disposition instead
-            # of normal response headers so it's no longer easy to identify
-            # file type.
-            #
-            if 'content-disposition' in headers:
-                pattern = r'attachment; filename=("?)(?P<filename>[^;]+)\1'
-                match = re.match(pattern, headers['content-disposition'], re.I)
-                if match:
-                    _, attachment_ext = splitext(match.group('filename'))
-                    if path_ext == attachment_ext:
-                        _L.debug('Content-Disposition agrees: "{}"'.format(match.group('filename')))
-                    else:
-                        _L.debug('Content-Disposition disagrees: "{}" says we should use "{}", using "{}" instead'.format(
-                            match.group('filename'),
-                            attachment_ext,
-                            path_ext,
-                        ))
-
-        if not path_ext:
-            #
-            # Headers didn't clearly define a known extension.
-            # Instead, shell out to `file` to peek at the content.
-            #
-            mime_type = get_content_mimetype(content_path)
-            _L.debug('file says "{}" for {}'.format(mime_type, url))
-            path_ext = mimetypes.guess_extension(mime_type, False)
+    return mime_type.decode('utf-8')
 
-    return path_ext
+def preallocate(file, headers):
+    ''' Reserve disk space for a download when its final size is known.
 
-def get_content_mimetype(path):
-    ''' Get a mime-type for a short length of file content.
+        Only an uncompressed Content-Length describes the bytes we will write.
     '''
-    mime_type = check_output(('file', '--mime-type', '-b', path)).strip()
-    os.remove(path)
+    if not hasattr(os, 'posix_fallocate') or 'content-encoding' in headers:
+        return
 
-    return mime_type.decode('utf-8')
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        return
+
+    if length > 0:
+        try:
+            os.posix_fallocate(file.fileno(), 0, length)
+        except OSError:
+            _L.debug("Could not preallocate %s bytes for %s", length, file.name)
+
+def copy_local_file(src_path, dst_path):
+    ''' Copy a local file inside the kernel where possible.
+
+        copy_file_range() avoids user-space buffers and can share extents
+        on copy-on-write filesystems; other platforms use shutil.copyfile().
+    '''
+    if not hasattr(os, 'copy_file_range'):
+        shutil.copyfile(src_path, dst_path)
+        return
+
+    with open(src_path, 'rb') as src_file, open(dst_path, 'wb') as dst_file:
+        src_fd, dst_fd = src_file.fileno(), dst_file.fileno()
+        remaining = os.fstat(src_fd).st_size
+
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(src_fd, dst_fd, remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        except OSError:
+            # Unsupported across some filesystems; finish from the current offsets.
+            shutil.copyfileobj(src_file, dst_file, DOWNLOAD_BUFFER_SIZE)
 
 class URLDownloadTask(DownloadTask):
-    CHUNK = 16 * 1024
+    CHUNK = DOWNLOAD_CHUNK_SIZE
 
-    def get_file_path(self, url, dir_path):
+    def get_file_path(self, url, dir_path, path_ext=None):
         ''' Return a local file path in a directory for a URL.
 
-            May need to fill in a filename extension based on HTTP Content-Type.
+            May need to fill in a filename extension based on HTTP Content-Type,
+            unless one is already known.
         '''
         scheme, host, path, _, _, _ = urlparse(url)
         path_base, _ = os.path.splitext(path)
@@ -251,51 +428,109 @@ class URLDownloadTask(DownloadTask):
             hash = sha1((host + path_base).encode('utf-8'))
             name_base = u'{}-{}'.format(self.source_prefix, hash.hexdigest()[:8])
 
-        path_ext = guess_url_file_extension(url)
+        if path_ext is None:
+            path_ext = guess_url_file_extension(url)
         _L.debug(u'Guessed {}{} for {}'.format(name_base, path_ext, url))
 
         return os.path.join(dir_path, name_base + path_ext)
 
     def download(self, source_urls, workdir, source_config):
-        output_files = []
         download_path = os.path.join(workdir, 'http')
         mkdirsp(download_path)
 
-        for source_url in source_urls:
+        # HTTP cache validators for each downloaded URL, see conditional_headers()
+        self.validators = {}
+
+        if len(source_urls) <= 1:
+            return [self._download_one(url, download_path) for url in source_urls]
+
+        # Downloads are independent and I/O-bound, so overlap them;
+        # map() keeps output files in the same order as source URLs.
+        with ThreadPoolExecutor(max_workers=min(DOWNLOAD_THREADS, len(source_urls))) as executor:
+            return list(executor.map(lambda url: self._download_one(url, download_path), source_urls))
+
+    def _download_one(self, source_url, download_path):
+        scheme, _, path, _, _, _ = urlparse(source_url)
+        resp, content, chunks = None, b'', ()
+
+        if scheme in ('http', 'https') and url_file_extension(source_url) is None:
+            # Guess the file type from the download itself rather than
+            # requesting the URL a second time just to sniff it.
+            resp = self._request(source_url)
+            chunks = resp.iter_content(self.CHUNK)
+            content = read_content_head(chunks)
+            path_ext = guess_content_file_extension(source_url, resp.headers, content)
+            file_path = self.get_file_path(source_url, download_path, path_ext)
+        else:
             file_path = self.get_file_path(source_url, download_path)
 
-            # FIXME: For URLs with file:// scheme, simply copy the file
-            # to the expected location so that os.path.exists() returns True.
-            # Instead, implement a FileDownloadTask class?
-            scheme, _, path, _, _, _ = urlparse(source_url)
-            if scheme == 'file':
-                shutil.copy(path, file_path)
+        # FIXME: For URLs with file:// scheme, simply copy the file
+        # to the expected location so that os.path.exists() returns True.
+        # Instead, implement a FileDownloadTask class?
+        if scheme == 'file':
+            copy_local_file(path, file_path)
 
-            if os.path.exists(file_path):
-                output_files.append(file_path)
-                _L.debug("File exists %s", file_path)
-                continue
+        if os.path.exists(file_path):
+            if resp is not None:
+                resp.close()
+            _L.debug("File exists %s", file_path)
+            return file_path
 
-            try:
-                resp = request('GET', source_url, headers=self.headers, stream=True)
-            except Exception as e:
-                raise DownloadError("Could not connect to URL", e)
+        if resp is None:
+            resp = self._request(source_url)
+            chunks = resp.iter_content(self.CHUNK)
 
-            if resp.status_code in range(400, 499):
-                raise DownloadError('{} response from {}'.format(resp.status_code, source_url))
+        size = len(content)
+        with open(file_path, 'wb', buffering=DOWNLOAD_BUFFER_SIZE) as fp:
+            preallocate(fp, resp.headers)
+            fp.write(content)
 
-            size = 0
-            with open(file_path, 'wb') as fp:
-                for chunk in resp.iter_content(self.CHUNK):
-                    size += len(chunk)
-                    fp.write(chunk)
+            for chunk in chunks:
+                size += len(chunk)
+                fp.write(chunk)
 
-            output_files.append(file_path)
+            # Trim any preallocated space the body did not fill.
+            fp.truncate()
 
-            _L.info("Downloaded %s bytes for file %s", size, file_path)
+        _L.info("Downloaded %s bytes for file %s", size, file_path)
 
-        return output_files
+        return file_path
+
+    def _request(self, source_url):
+        ''' Start a streamed GET of a source URL, raising on unusable responses.
+        '''
+        try:
+            resp = request('GET', source_url, headers=self.headers, stream=True)
+        except Exception as e:
+            raise DownloadError("Could not connect to URL", e)
 
+        if resp.status_code == 304:
+            raise NotModified('{} has not changed'.format(source_url))
+
+        if resp.status_code in range(400, 499):
+            raise DownloadError('{} response from {}'.format(resp.status_code, source_url))
+
+        self.validators[source_url] = {key: resp.headers[header]
+            for (key, header) in (('etag', 'ETag'), ('last_modified', 'Last-Modified'))
+            if header in resp.headers}
+
+        return resp
+
+
+def geometry_wkt(geom):
+    ''' Return WKT for a GeoJSON-like geometry dictionary.
+
+        Plain 2D points, most of what address layers contain, are
+        formatted directly instead of round-tripping through shapely.
+    '''
+    if geom.get('type') == 'Point':
+        coords = geom.get('coordinates')
+        if isinstance(coords, (list, tuple)) and len(coords) == 2:
+            x, y = coords
+            if is_coordinate(x) and is_coordinate(y) and math.isfinite(x) and math.isfinite(y):
+                return 'POINT ({} {})'.format(x, y)
+
+    return shape(geom).wkt
 
 class EsriRestDownloadTask(DownloadTask):
 
@@ -314,19 +549,28 @@ class EsriRestDownloadTask(DownloadTask):
 
     @classmethod
     def fields_from_conform_function(cls, v):
-        fxn = v.get('function')
-        if fxn:
+        if not v.get('function'):
+            return None
+
+        fields = set()
+        stack = [(v, frozenset())]
+
+        # Walk nested chains without recursion, carrying along the
+        # variables each enclosing chain defines since they aren't fields.
+        while stack:
+            v, user_vars = stack.pop()
+            fxn = v.get('function')
+
             if fxn in ('join', 'format'):
-                return set(v['fields'])
+                fields.update(f for f in v['fields'] if f not in user_vars)
             elif fxn == 'chain':
-                fields = set()
-                user_vars = set([v['variable']])
-                for func in v['functions']:
-                    if isinstance(func, dict) and 'function' in func:
-                        fields |= cls.fields_from_conform_function(func) - user_vars
-                return fields
-            else:
-                return set([v.get('field')])
+                chain_vars = user_vars | {v['variable']}
+                stack.extend((func, chain_vars) for func in v['functions']
+                             if isinstance(func, dict) and 'function' in func)
+            elif v.get('field') not in user_vars:
+                fields.add(v.get('field'))
+
+        return fields
 
     @classmethod
     def field_names_to_request(cls, source_config):
@@ -364,6 +608,11 @@ class EsriRestDownloadTask(DownloadTask):
         query_fields = EsriRestDownloadTask.field_names_to_request(source_config)
         conform = source_config.data_source.get('conform') or {}
 
+        # Conform lat and lon fields, used for features without a geometry
+        lat_field_name, lon_field_name = conform.get('lat'), conform.get('lon')
+        use_lat_lon = bool(lat_field_name and lon_field_name)
+        lat_lon_are_fields = isinstance(lat_field_name, str) and isinstance(lon_field_name, str)
+
         for source_url in source_urls:
             size = 0
             file_path = self.get_file_path(source_url, download_path)
@@ -392,45 +641,47 @@ class EsriRestDownloadTask(DownloadTask):
             except EsriDownloadError:
                 _L.info("Source doesn't support count")
 
-            with open(file_path, 'w', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=field_names)
-                writer.writeheader()
+            with open(file_path, 'w', encoding='utf-8', newline='', buffering=DOWNLOAD_BUFFER_SIZE) as f:
+                writer = csv.writer(f)
+                writer.writerow(field_names)
+                writerow = writer.writerow
 
                 for feature in downloader:
+                    geom = feature.get('geometry') or {}
+                    row = feature.get('properties') or {}
+
+                    # If the feature doesn't have a geometry, see if the conform has lat and lon fields specified
+                    # and try to build a point geometry from them
+                    if not geom and use_lat_lon:
+                        # Don't support functions to build the geometry yet
+                        if not lat_lon_are_fields:
+                            _L.debug("Skipping a geometry: lat and lon don't support functions yet")
+                            continue
+
+                        try:
+                            geom = {
+                                'type': 'Point',
+                                'coordinates': [float(row.get(lon_field_name)), float(row.get(lat_field_name))]
+                            }
+                        except (TypeError, ValueError):
+                            _L.debug("Skipping a geometry: couldn't build geometry from lat and lon fields")
+                            continue
+
+                    if not geom:
+                        _L.debug("Skipping a geometry: no geometry parsed")
+                        continue
+                    if any((isinstance(g, float) and math.isnan(g)) for g in traverse(geom)):
+                        _L.debug("Skipping a geometry: geometry has NaN coordinates")
+                        continue
+
                     try:
-                        geom = feature.get('geometry') or {}
-                        row = feature.get('properties') or {}
-
-                        # If the feature doesn't have a geometry, see if the conform has lat and lon fields specified
-                        # and try to build a point geometry from them
-                        if not geom and conform.get('lat') and conform.get('lon'):
-                            lat_field_name = conform['lat']
-                            lon_field_name = conform['lon']
-
-                            # Don't support functions to build the geometry yet
-                            if not isinstance(lat_field_name, str) or not isinstance(lon_field_name, str):
-                                raise TypeError("lat and lon don't support functions yet")
-
-                            try:
-                                geom = {
-                                    'type': 'Point',
-                                    'coordinates': [float(row.get(lon_field_name)), float(row.get(lat_field_name))]
-                                }
-                            except (TypeError, ValueError):
-                                raise TypeError("Couldn't build geometry from lat and lon fields")
-
-                        if not geom:
-                            raise TypeError("No geometry parsed")
-                        if any((isinstance(g, float) and math.isnan(g)) for g in traverse(geom)):
-                            raise TypeError("Geometry has NaN coordinates")
-
-                        shp = shape(geom)
-                        row[GEOM_FIELDNAME] = shp.wkt
-
-                        writer.writerow({fn: row.get(fn) for fn in field_names})
-                        size += 1
+                        row[GEOM_FIELDNAME] = geometry_wkt(geom)
                     except TypeError:
                         _L.debug("Skipping a geometry", exc_info=True)
+                        continue
+
+                    writerow([row.get(fn) for fn in field_names])
+                    size += 1
 
             _L.info("Downloaded %s ESRI features for file %s", size, file_path)
             output_files.append(file_path)
@@ -5,13 +5,17 @@ import logging; _L = logging.getLogger('openaddr.conform')
 
 import os
 import errno
-import gzip
+import shutil
+import subprocess
 import tempfile
 import mimetypes
 import json
-import copy
 import csv
 import re
+import functools
+import itertools
+import math
+import multiprocessing
 import osgeo
 
 from .geojson import stream_geojson
@@ -19,7 +23,9 @@ from .geojson import stream_geojson
 from shapely.wkt import loads as wkt_loads
 from shapely.geometry import mapping
 
-from zipfile import ZipFile
+from zipfile import ZipFile, ZipInfo
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from collections import deque
 from locale import getpreferredencoding
 from os.path import splitext
 from hashlib import sha1
@@ -28,6 +34,18 @@ from uuid import uuid4
 from osgeo import ogr, osr, gdal
 ogr.UseExceptions()
 
+try:
+    # python-isal's igzip is a faster drop-in for the gzip module
+    from isal import igzip as gzip
+except ImportError:
+    import gzip
+
+try:
+    # orjson is an optional, faster encoder for geometries handed to OGR
+    import orjson
+except ImportError:
+    orjson = None
+
 def gdal_error_handler(err_class, err_num, err_msg):
     errtype = {
             gdal.CE_None:'None',
@@ -56,6 +74,38 @@ RESERVED_SCHEMA = ADDRESSES_SCHEMA + BUILDINGS_SCHEMA + PARCELS_SCHEMA + [
 UNZIPPED_DIRNAME = 'unzipped'
 UNGZIPPED_DIRNAME = 'ungzipped'
 
+# Copy buffer size in bytes for extracting archive members
+EXTRACT_BUFFER_SIZE = 1 << 20
+
+# Most threads inflating members of one zip archive at once
+EXTRACT_THREADS = 8
+
+# Write buffer size in bytes for extracted CSV and output GeoJSON files
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# Point features collected for each batched coordinate transform
+TRANSFORM_BATCH_SIZE = 10000
+
+# Extracted rows handed to each conform worker process at once
+CONFORM_BATCH_SIZE = 5000
+
+# Environment variable with the number of worker processes applying conform
+# rules to one extract, or "auto" for one per CPU. Unset applies them inline,
+# since batch hosts usually run one process_one per source already.
+CONFORM_PROCESSES_VAR = 'OPENADDR_CONFORM_PROCESSES'
+
+# House number alternatives shared by the number and street patterns below:
+# - just digits with optional fractional
+# - two groups of digits separated by a hyphen (for queens-style addresses, eg - 69-15 51st Ave)
+# - digits and a letter, optionally separated by a hyphen
+_NUMBER_ALT = r"\d+(?:[ -]\d/\d)?|\d+-\d+|\d+-?[A-Z]"
+
+# Unit designators shared by the street-with-units and unit patterns below.
+_UNIT_ALT = r"(?:UNIT|APARTMENT|APT\.?|SUITE|STE\.?|BUILDING|BLDG\.?|LOT)\s+|#"
+
+# These stay separate compiled patterns rather than one combined address
+# regex: each conform function extracts a single part of a single field.
+
 # extracts:
 # - '123' from '123 Main St'
 # - '123 1/2' from '123 1/2 Main St'
@@ -64,12 +114,7 @@ UNGZIPPED_DIRNAME = 'ungzipped'
 # - '123a' from '123a Main St'
 # - '123-a' from '123-a Main St'
 # - '' from '3rd St' (the 3 belongs to the street, it's not a house number)
-#
-# this regex can be optimized but number scenarios are much cleaner this way:
-# - just digits with optional fractional
-# - two groups of digits separated by a hyphen (for queens-style addresses, eg - 69-15 51st Ave)
-# - digits and a letter, optionally separated by a hyphen
-prefixed_number_pattern = re.compile("^\s*(\d+(?:[ -]\d/\d)?|\d+-\d+|\d+-?[A-Z])\s+", re.IGNORECASE)
+prefixed_number_pattern = re.compile(r"^\s*(" + _NUMBER_ALT + r")\s+", re.IGNORECASE)
 
 # extracts:
 # - 'Main St' from '123 Main St'
@@ -79,9 +124,7 @@ prefixed_number_pattern = re.compile("^\s*(\d+(?:[ -]\d/\d)?|\d+-\d+|\d+-?[A-Z])
 # - 'Main St' from '123a Main St'
 # - 'Main St' from '123-a Main St'
 # - 'Main St' from 'Main St'
-#
-# like prefixed_number_pattern, this regex can be optimized but this is cleaner
-postfixed_street_pattern = re.compile("^(?:\s*(?:\d+(?:[ -]\d/\d)?|\d+-\d+|\d+-?[A-Z])\s+)?(.*)", re.IGNORECASE)
+postfixed_street_pattern = re.compile(r"^(?:\s*(?:" + _NUMBER_ALT + r")\s+)?(.*)", re.IGNORECASE)
 
 # extracts:
 # - 'Main Street' from '123 Main Street Unit 3'
@@ -99,7 +142,7 @@ postfixed_street_pattern = re.compile("^(?:\s*(?:\d+(?:[ -]\d/\d)?|\d+-\d+|\d+-?
 # - 'Main Street' from '123 Main Street # 3'
 # This regex contains 3 groups: optional house number, street, optional unit
 # only street is a matching group, house number and unit are non-matching
-postfixed_street_with_units_pattern = re.compile("^(?:\s*(?:\d+(?:[ -]\d/\d)?|\d+-\d+|\d+-?[A-Z])\s+)?(.+?)(?:\s+(?:(?:UNIT|APARTMENT|APT\.?|SUITE|STE\.?|BUILDING|BLDG\.?|LOT)\s+|#).+)?$", re.IGNORECASE)
+postfixed_street_with_units_pattern = re.compile(r"^(?:\s*(?:" + _NUMBER_ALT + r")\s+)?(.+?)(?:\s+(?:" + _UNIT_ALT + r").+)?$", re.IGNORECASE)
 
 # extracts:
 # - 'Unit 3' from 'Main Street Unit 3'
@@ -115,7 +158,14 @@ postfixed_street_with_units_pattern = re.compile("^(?:\s*(?:\d+(?:[ -]\d/\d)?|\d
 # - 'Lot 3' from 'Main Street Lot 3'
 # - '#3' from 'Main Street #3'
 # - '# 3' from 'Main Street # 3'
-postfixed_unit_pattern = re.compile("\s((?:(?:UNIT|APARTMENT|APT\.?|SUITE|STE\.?|BUILDING|BLDG\.?|LOT)\s+|#).+)$", re.IGNORECASE)
+postfixed_unit_pattern = re.compile(r"\s((?:" + _UNIT_ALT + r").+)$", re.IGNORECASE)
+
+# $1, $2, ... field references in format function strings
+format_var_pattern = re.compile(r'\$([0-9]+)')
+
+# Plain 2D WKT points, as written by OGR and the ESRI downloader
+_WKT_NUMBER = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+wkt_point_pattern = re.compile(r'POINT \((' + _WKT_NUMBER + r') (' + _WKT_NUMBER + r')\)$')
 
 def mkdirsp(path):
     try:
@@ -188,17 +238,47 @@ class GuessDecompressTask(DecompressionTask):
 def is_in(path, names):
     '''
     '''
-    if path.lower() in names:
+    path = os.path.normpath(path.lower())
+    names = [os.path.normpath(name) for name in names]
+
+    if path in names:
         # Found it!
         return True
 
-    for name in names:
-        # Maybe one of the names is an enclosing directory?
-        if not os.path.relpath(path.lower(), name).startswith('..'):
-            # Yes, that's it.
-            return True
+    # Maybe one of the names is an enclosing directory? Compare strings
+    # rather than calling relpath(), which looks up the cwd every time.
+    return path.startswith(tuple(name + os.path.sep for name in names))
+
+def extract_zip_member(zip_file, member, target_dir):
+    ''' Extract one member of a ZipFile under target_dir and return its path.
+
+        Sanitizes names like ZipFile.extract(), but copies through a larger buffer.
+    '''
+    info = member if isinstance(member, ZipInfo) else zip_file.getinfo(member)
+
+    # Drop drive letters, absolute roots, and "." or ".." components
+    arcname = os.path.splitdrive(info.filename.replace('/', os.path.sep))[1]
+    invalid_path_parts = ('', os.path.curdir, os.path.pardir)
+    arcname = os.path.sep.join(x for x in arcname.split(os.path.sep) if x not in invalid_path_parts)
+    target_path = os.path.normpath(os.path.join(target_dir, arcname))
+
+    if info.is_dir():
+        mkdirsp(target_path)
+        return target_path
+
+    mkdirsp(os.path.dirname(target_path))
 
-    return False
+    with zip_file.open(info) as source, open(target_path, 'wb') as dest:
+        shutil.copyfileobj(source, dest, EXTRACT_BUFFER_SIZE)
+
+    return target_path
+
+def extract_zip_members(source_path, names, target_dir):
+    ''' Extract named members of a zip file at source_path under target_dir.
+    '''
+    with ZipFile(source_path, 'r') as zip_file:
+        for name in names:
+            extract_zip_member(zip_file, name, target_dir)
 
 class ZipDecompressTask(DecompressionTask):
     def decompress(self, source_paths, workdir, filenames):
@@ -209,13 +289,26 @@ class ZipDecompressTask(DecompressionTask):
         # Extract contents of zip file into expand_path directory.
         for source_path in source_paths:
             with ZipFile(source_path, 'r') as z:
-                for name in z.namelist():
+                names = []
+
+                # Repeated names resolve to the same last entry, so extract each once.
+                for name in dict.fromkeys(z.namelist()):
                     if len(filenames) and not is_in(name, filenames):
                         # Download only the named file, if any.
                         _L.debug("Skipped file {}".format(name))
                         continue
 
-                    z.extract(name, expand_path)
+                    names.append(name)
+
+            # zlib releases the GIL while inflating, so members extract in
+            # parallel; each thread reads its share through its own ZipFile.
+            workers = min(EXTRACT_THREADS, os.cpu_count() or 1, len(names))
+            if workers <= 1:
+                extract_zip_members(source_path, names, expand_path)
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    list(executor.map(lambda share: extract_zip_members(source_path, share, expand_path),
+                                      [names[i::workers] for i in range(workers)]))
 
         # Collect names of directories and files in expand_path directory.
         for (dirpath, dirnames, filenames) in os.walk(expand_path):
@@ -230,6 +323,9 @@ class ZipDecompressTask(DecompressionTask):
         return output_files
 
 class GzipDecompressTask(DecompressionTask):
+    # pigz decompresses faster than the gzip module, use it when installed
+    pigz_path = shutil.which('pigz')
+
     def decompress(self, source_paths, workdir, filenames):
         output_files = []
         expand_path = os.path.join(workdir, UNGZIPPED_DIRNAME)
@@ -240,9 +336,12 @@ class GzipDecompressTask(DecompressionTask):
             expanded_path = os.path.join(expand_path, os.path.basename(source_path)[:-3])
 
             with open(expanded_path, 'wb') as temp_fp:
-                with open(source_path, 'rb') as source_fp:
-                    with gzip.open(source_fp, 'rb') as gz_fp:
-                        temp_fp.write(gz_fp.read())
+                if self.pigz_path:
+                    subprocess.run((self.pigz_path, '-dc', source_path), stdout=temp_fp, check=True)
+                else:
+                    with open(source_path, 'rb') as source_fp:
+                        with gzip.open(source_fp, 'rb') as gz_fp:
+                            shutil.copyfileobj(gz_fp, temp_fp)
 
             output_files.append(temp_fp.name)
             _L.debug("Ungzipped file {}".format(output_files[-1]))
@@ -424,24 +523,27 @@ class ConvertToGeojsonTask(object):
         # Conversion must have failed
         return None, 0
 
+# $n or ${n} back-references in conform regexp replace strings
+_DOLLAR_REFERENCE_PATTERN = re.compile(r'\$(?:\{(\d+)\}|(\d+))')
+
+def _slash_reference(match):
+    braced, bare = match.groups()
+    return r'\g<{}>'.format(braced) if braced else '\\' + bare
+
 def convert_regexp_replace(replace):
     ''' Convert regular expression replace string from $ syntax to slash-syntax.
 
-        Replace one kind of replacement, then call self recursively to find others.
+        Both $dd* and ${dd*} back-references are rewritten in a single pass.
     '''
-    if re.search(r'\$\d+\b', replace):
-        # $dd* back-reference followed by a word break.
-        return convert_regexp_replace(re.sub(r'\$(\d+)\b', r'\\\g<1>', replace))
+    return _DOLLAR_REFERENCE_PATTERN.sub(_slash_reference, replace)
 
-    if re.search(r'\$\d+\D', replace):
-        # $dd* back-reference followed by an non-digit character.
-        return convert_regexp_replace(re.sub(r'\$(\d+)(\D)', r'\\\g<1>\g<2>', replace))
+# Most distinct regexp function patterns kept compiled at once
+REGEXP_CACHE_SIZE = 256
 
-    if re.search(r'\$\{\d+\}', replace):
-        # ${dd*} back-reference.
-        return convert_regexp_replace(re.sub(r'\$\{(\d+)\}', r'\\g<\g<1>>', replace))
-
-    return replace
+@functools.lru_cache(maxsize=REGEXP_CACHE_SIZE)
+def _compile_regexp_function(pattern, replace):
+    "Return a compiled pattern and slash-syntax replace string for a regexp function"
+    return re.compile(pattern), (convert_regexp_replace(replace) if replace else replace)
 
 def normalize_ogr_filename_case(source_path):
     '''
@@ -470,6 +572,75 @@ def normalize_ogr_filename_case(source_path):
 
     return normal_path
 
+def transform_points_wkt(coord_transform, points):
+    ''' Reproject a list of (x, y) pairs in one PROJ call.
+
+        Returns OGR's WKT for each point, or None for any that failed.
+    '''
+    if not points:
+        return []
+
+    try:
+        transformed = coord_transform.TransformPoints(points)
+    except RuntimeError:
+        return [None] * len(points)
+
+    wkts = []
+
+    for coords in transformed:
+        x, y = coords[0], coords[1]
+        if math.isfinite(x) and math.isfinite(y):
+            point = ogr.Geometry(ogr.wkbPoint)
+            point.AddPoint_2D(x, y)
+            wkts.append(point.ExportToWkt())
+        else:
+            wkts.append(None)
+
+    return wkts
+
+class PointBatchWriter(object):
+    ''' Write rows to a CSV writer, reprojecting plain 2D points in batches.
+
+        Rows added with source coordinates get their geometry columns from
+        one transform_points_wkt() call per TRANSFORM_BATCH_SIZE rows, or
+        from fallback(key) for any point that call could not transform.
+        Rows are written in the order they were added.
+    '''
+    def __init__(self, writer, coord_transform, fallback, geom_indexes=(-1, )):
+        self.writer = writer
+        self.coord_transform = coord_transform
+        self.fallback = fallback
+        self.geom_indexes = geom_indexes
+        self.pending = []
+
+    def writerow(self, row, xy=None, key=None):
+        if xy is None and not self.pending:
+            # Nothing is waiting on a transform, so keep source order as-is
+            self.writer.writerow(row)
+            return
+
+        self.pending.append((row, xy, key))
+
+        if len(self.pending) >= TRANSFORM_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        points = [xy for (row, xy, key) in self.pending if xy is not None]
+        transformed = iter(transform_points_wkt(self.coord_transform, points))
+
+        for (row, xy, key) in self.pending:
+            if xy is not None:
+                # A point is its own point on surface, so GEOS is skipped
+                wkt = next(transformed)
+                if wkt is None:
+                    # Let OGR report the failure the way it does for one geometry
+                    wkt = self.fallback(key)
+                for i in self.geom_indexes:
+                    row[i] = wkt
+            self.writer.writerow(row)
+
+        self.pending.clear()
+
 # TODO rip out a bunch of this and replace with call to row_extract_and_reproject
 def ogr_source_to_csv(source_config, source_path, dest_path):
     ''' Convert a single shapefile or GeoJSON in source_path and put it in dest_path
@@ -488,26 +659,27 @@ def ogr_source_to_csv(source_config, source_path, dest_path):
         _L.error("Requested layer not found among layers: %s", ", ".join([l.GetName() for l in in_datasource]))
         raise Exception("Layer %s not found")
 
-    # Determine the appropriate SRS
+    # Determine the appropriate SRS and set up a transformation to EPSG:4326
     inSpatialRef = in_layer.GetSpatialRef()
     srs = source_config.data_source["conform"].get("srs", None)
 
-    # Skip Transformation is the EPSG code is superfluous
     if srs is not None:
         # OGR may have a projection, but use the explicit SRS instead
         if srs.startswith(u"EPSG:"):
             _L.debug("SRS tag found specifying %s", srs)
-            inSpatialRef = osr.SpatialReference()
-            inSpatialRef.ImportFromEPSG(int(srs[5:]))
+            coordTransform = _ogr_transform_to_4326(int(srs[5:]))
         else:
             # OGR is capable of doing more than EPSG, but so far we don't need it.
             raise Exception("Bad SRS. Can only handle EPSG, the SRS tag is %s", srs)
     elif inSpatialRef is None:
         raise Exception("No projection found for source {}".format(source_path))
+    else:
+        coordTransform = osr.CoordinateTransformation(inSpatialRef, _spatial_ref_4326())
 
     # Determine the appropriate text encoding. This is complicated in OGR, see
     # https://github.com/openaddresses/machine/issues/42
-    if in_layer.TestCapability(ogr.OLCStringsAsUTF8):
+    strings_as_utf8 = in_layer.TestCapability(ogr.OLCStringsAsUTF8)
+    if strings_as_utf8:
         # OGR turned this to UTF 8 for us
         shp_encoding = 'utf-8'
     elif "encoding" in source_config.data_source["conform"]:
@@ -520,62 +692,72 @@ def ogr_source_to_csv(source_config, source_path, dest_path):
     # Get the input schema, create an output schema
     in_layer_defn = in_layer.GetLayerDefn()
     out_fieldnames = []
+    field_info = []
     for i in range(0, in_layer_defn.GetFieldCount()):
         field_defn = in_layer_defn.GetFieldDefn(i)
         out_fieldnames.append(field_defn.GetName())
+        # Strings OGR already gives as UTF-8 can be read directly
+        needs_recode = field_defn.type == ogr.OFTString and not strings_as_utf8
+        field_info.append((i, field_defn.GetNameRef(), needs_recode))
     out_fieldnames.append(GEOM_FIELDNAME)
 
-    # Set up a transformation from the source SRS to EPSG:4326
-    outSpatialRef = osr.SpatialReference()
-    outSpatialRef.ImportFromEPSG(4326)
+    is_addresses = source_config.layer == "addresses"
 
-    if int(osgeo.__version__[0]) >= 3:
-        # GDAL 3 changes axis order: https://github.com/OSGeo/gdal/issues/1546
-        outSpatialRef.SetAxisMappingStrategy(osgeo.osr.OAMS_TRADITIONAL_GIS_ORDER)
+    def transformed_wkt(geom):
+        geom.Transform(coordTransform)
 
-    coordTransform = osr.CoordinateTransformation(inSpatialRef, outSpatialRef)
+        if is_addresses:
+            # For Addresses - Calculate the centroid on surface of the geometry and write it as X and Y columns
+            try:
+                centroid = geom.PointOnSurface()
+            except RuntimeError as e:
+                if 'Invalid number of points in LinearRing found' not in str(e):
+                    raise
+                xmin, xmax, ymin, ymax = geom.GetEnvelope()
 
-    # Write a CSV file with one row per feature in the OGR source
-    with open(dest_path, 'w', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=out_fieldnames)
-        writer.writeheader()
+                centroid = ogr.CreateGeometryFromWkt("POINT ({} {})".format(xmin/2 + xmax/2, ymin/2 + ymax/2))
 
-        in_feature = in_layer.GetNextFeature()
-        while in_feature:
-            row = dict()
+            return centroid.ExportToWkt()
+        else:
+            return geom.ExportToWkt()
 
-            for i in range(0, in_layer_defn.GetFieldCount()):
-                field_defn = in_layer_defn.GetFieldDefn(i)
-                field_value = in_feature.GetField(i)
-                if field_defn.type is ogr.OFTString:
-                    # Convert OGR's byte sequence strings to Python Unicode strings
-                    field_value = in_feature.GetFieldAsBinary(i).decode(shp_encoding)
-                row[field_defn.GetNameRef()] = field_value
-            geom = in_feature.GetGeometryRef()
-            if geom is not None:
-                geom.Transform(coordTransform)
+    def point_wkt(xy):
+        point = ogr.Geometry(ogr.wkbPoint)
+        point.AddPoint_2D(*xy)
+        return transformed_wkt(point)
 
-                if source_config.layer == "addresses":
-                    # For Addresses - Calculate the centroid on surface of the geometry and write it as X and Y columns
-                    try:
-                        centroid = geom.PointOnSurface()
-                    except RuntimeError as e:
-                        if 'Invalid number of points in LinearRing found' not in str(e):
-                            raise
-                        xmin, xmax, ymin, ymax = geom.GetEnvelope()
+    # Rows are dicts by field name, so every geometry column gets the geometry
+    out_geom = [j for (j, fn) in enumerate(out_fieldnames) if fn == GEOM_FIELDNAME]
 
-                        centroid = ogr.CreateGeometryFromWkt("POINT ({} {})".format(xmin/2 + xmax/2, ymin/2 + ymax/2))
+    # Write a CSV file with one row per feature in the OGR source
+    with open(dest_path, 'w', encoding='utf-8', newline='', buffering=OUTPUT_BUFFER_SIZE) as f:
+        writer = csv.writer(f)
+        writer.writerow(out_fieldnames)
 
-                    row[GEOM_FIELDNAME] = centroid.ExportToWkt()
+        # Plain points are reprojected together in batched PROJ calls
+        batch = PointBatchWriter(writer, coordTransform, point_wkt, out_geom)
+
+        # The layer iterator resets reading and releases each feature in turn
+        for in_feature in in_layer:
+            row = dict()
+
+            for (i, field_name, needs_recode) in field_info:
+                if needs_recode:
+                    # Convert OGR's byte sequence strings to Python Unicode strings
+                    row[field_name] = in_feature.GetFieldAsBinary(i).decode(shp_encoding)
                 else:
-                    row[GEOM_FIELDNAME] = geom.ExportToWkt()
+                    row[field_name] = in_feature.GetField(i)
+            geom = in_feature.GetGeometryRef()
+            if geom is None:
+                row[GEOM_FIELDNAME], xy = None, None
+            elif geom.GetGeometryType() == ogr.wkbPoint and not geom.IsEmpty():
+                row[GEOM_FIELDNAME], xy = None, (geom.GetX(), geom.GetY())
             else:
-                row[GEOM_FIELDNAME] = None
+                row[GEOM_FIELDNAME], xy = transformed_wkt(geom), None
 
-            writer.writerow(row)
+            batch.writerow([row.get(fn) for fn in out_fieldnames], xy, xy)
 
-            in_feature.Destroy()
-            in_feature = in_layer.GetNextFeature()
+        batch.flush()
 
     in_datasource.Destroy()
 
@@ -643,49 +825,177 @@ def csv_source_to_csv(source_config, source_path, dest_path):
             out_fieldnames = [fn for fn in reader.fieldnames if fn not in old_ll]
             out_fieldnames.append(GEOM_FIELDNAME)
 
+        # Conform settings are the same for every row
+        settings = extract_and_reproject_settings(source_config)
+        lat_name, lon_name, has_lat_lon, needs_reproject, srs, is_addresses = settings
+
+        # Rows are read by position rather than as DictReader dicts, so look
+        # up where each named column is once. Later columns win, as in a dict.
+        src_idx = {fn: i for (i, fn) in enumerate(reader.fieldnames)}
+        geom_i = src_idx.get(GEOM_FIELDNAME)
+        lon_i, lat_i = src_idx.get(lon_name), src_idx.get(lat_name)
+        out_geom = [j for (j, fn) in enumerate(out_fieldnames) if fn == GEOM_FIELDNAME]
+        out_idx = [None if fn == GEOM_FIELDNAME else src_idx[fn] for fn in out_fieldnames]
+
+        # Output columns emptied when geometry comes from lat/lon values
+        lat_lon_out = [j for (j, fn) in enumerate(out_fieldnames)
+                       if has_lat_lon and fn in (lon_name, lat_name)]
+
+        # DictReader collapses repeated column names, so rows of such
+        # files never had the expected number of columns.
+        has_repeated_names = len(src_idx) != num_fields
+
+        coord_transform = None
+        if needs_reproject:
+            try:
+                coord_transform = _transform_to_4326(srs)
+            except Exception:
+                # Leave any problem with the SRS to be reported row by row
+                coord_transform = None
+
+        def row_geometry(source_row, out_row):
+            ''' Get output geometry for a row, or source coordinates to batch.
+            '''
+            source_geom = None if geom_i is None else source_row[geom_i]
+
+            if source_geom == "POINT (nan nan)":
+                return None, None
+
+            if source_geom is not None and not (needs_reproject or is_addresses):
+                # Geometry such as ESRI's is already in EPSG:4326 and used as-is
+                return source_geom, None
+
+            if source_geom is None and has_lat_lon:
+                # Conforms can name the lat/lon columns from the original source data
+                if lon_i is None or lat_i is None:
+                    raise KeyError(lon_name if lon_i is None else lat_name)
+
+                for j in lat_lon_out:
+                    out_row[j] = None
+
+                source_geom = lat_lon_geometry(source_row[lon_i], source_row[lat_i])
+
+                if source_geom is None:
+                    return None, None
+
+            if source_geom is not None and coord_transform is not None:
+                point = wkt_point_pattern.match(source_geom)
+                if point is not None:
+                    return source_geom, (float(point.group(1)), float(point.group(2)))
+
+            return reproject_geometry(source_geom, needs_reproject, srs, is_addresses), None
+
+        def point_wkt(key):
+            row_number, source_geom = key
+            try:
+                return reproject_geometry(source_geom, needs_reproject, srs, is_addresses)
+            except Exception as e:
+                _L.error('Error in row {}: {}'.format(row_number, e))
+                raise
+
         # Write the extracted CSV file
-        with open(dest_path, 'w', encoding='utf-8') as dest_fp:
-            writer = csv.DictWriter(dest_fp, out_fieldnames)
-            writer.writeheader()
+        with open(dest_path, 'w', encoding='utf-8', newline='', buffering=OUTPUT_BUFFER_SIZE) as dest_fp:
+            writer = csv.writer(dest_fp)
+            writer.writerow(out_fieldnames)
+
+            batch = PointBatchWriter(writer, coord_transform, point_wkt, out_geom)
+
             # For every row in the source CSV
             row_number = 0
-            for source_row in reader:
+            for source_row in reader.reader:
+                if not source_row:
+                    # DictReader skips empty lines
+                    continue
                 row_number += 1
-                if len(source_row) != num_fields:
+                if len(source_row) > num_fields or has_repeated_names:
                     _L.debug("Skipping row. Got %d columns, expected %d", len(source_row), num_fields)
                     continue
+                elif len(source_row) < num_fields:
+                    # DictReader fills missing values with None
+                    source_row += [None] * (num_fields - len(source_row))
+
+                out_row = [None if i is None else source_row[i] for i in out_idx]
+
                 try:
-                    out_row = row_extract_and_reproject(source_config, source_row)
+                    geom, xy = row_geometry(source_row, out_row)
                 except Exception as e:
                     _L.error('Error in row {}: {}'.format(row_number, e))
                     raise
-                else:
-                    writer.writerow(out_row)
+
+                for j in out_geom:
+                    out_row[j] = geom
+
+                batch.writerow(out_row, xy, (row_number, geom))
+
+            batch.flush()
+
+def is_coordinate(value):
+    ''' True for a JSON number usable as a coordinate, which excludes bools.
+    '''
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def geojson_point_geometry(geometry):
+    ''' Build a 2D OGR point straight from a GeoJSON geometry dict.
+
+        Returns None for anything other than a plain 2D Point, which the
+        caller hands to OGR's GeoJSON reader instead.
+    '''
+    if geometry.get('type') != 'Point':
+        return None
+
+    coordinates = geometry.get('coordinates')
+    if not isinstance(coordinates, list) or len(coordinates) != 2:
+        return None
+
+    if not all(is_coordinate(c) for c in coordinates):
+        return None
+
+    x, y = float(coordinates[0]), float(coordinates[1])
+
+    geom = ogr.Geometry(ogr.wkbPoint)
+    geom.AddPoint_2D(x, y)
+    return geom
+
+def geometry_json(geometry):
+    ''' Encode a GeoJSON geometry dict as a JSON string for OGR.
+    '''
+    if orjson is not None:
+        try:
+            return orjson.dumps(geometry).decode('utf-8')
+        except TypeError:
+            # e.g. integers beyond 64 bits, which json can still encode
+            pass
+
+    return json.dumps(geometry)
 
 def geojson_source_to_csv(source_config, source_path, dest_path):
     '''
     '''
+    is_addresses = bool(source_config.layer == "addresses")
+
     # For every row in the source GeoJSON
-    with open(source_path) as file:
+    with open(source_path, 'rb') as file:
         # Write the extracted CSV file
-        with open(dest_path, 'w', encoding='utf-8') as dest_fp:
+        with open(dest_path, 'w', encoding='utf-8', newline='', buffering=OUTPUT_BUFFER_SIZE) as dest_fp:
             writer = None
             for (row_number, feature) in enumerate(stream_geojson(file)):
                 if writer is None:
                     out_fieldnames = list(feature['properties'].keys())
                     out_fieldnames.append(GEOM_FIELDNAME)
-                    writer = csv.DictWriter(dest_fp, out_fieldnames)
-                    writer.writeheader()
+                    writer = csv.writer(dest_fp)
+                    writer.writerow(out_fieldnames)
 
                 try:
                     row = feature['properties']
                     if feature['geometry'] is None:
                         continue
-                    geom = ogr.CreateGeometryFromJson(json.dumps(feature['geometry']))
+                    geom = geojson_point_geometry(feature['geometry'])
+                    if geom is None:
+                        geom = ogr.CreateGeometryFromJson(geometry_json(feature['geometry']))
                     if not geom:
                         continue
 
-                    if source_config.layer == "addresses":
+                    if is_addresses and geom.GetGeometryType() != ogr.wkbPoint:
                         # For Addresses - Calculate the centroid on surface of the geometry and write it as X and Y columns
                         geom = geom.PointOnSurface()
 
@@ -693,98 +1003,102 @@ def geojson_source_to_csv(source_config, source_path, dest_path):
                     _L.error('Error in row {}: {}'.format(row_number, e))
                     raise
                 else:
-                    row.update({GEOM_FIELDNAME: geom.ExportToWkt()})
-                    writer.writerow(row)
+                    row[GEOM_FIELDNAME] = geom.ExportToWkt()
+                    writer.writerow([row.get(fn) for fn in out_fieldnames])
+
+# Most distinct source projections kept ready to transform from
+TRANSFORM_CACHE_SIZE = 64
 
-_transform_cache = {}
+def _spatial_ref_4326():
+    "Return an EPSG:4326 OGR spatial reference in longitude, latitude order"
+    out_spatial_ref = osr.SpatialReference()
+    out_spatial_ref.ImportFromEPSG(4326)
+
+    if int(osgeo.__version__[0]) >= 3:
+        # GDAL 3 changes axis order: https://github.com/OSGeo/gdal/issues/1546
+        out_spatial_ref.SetAxisMappingStrategy(osgeo.osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    return out_spatial_ref
+
+@functools.lru_cache(maxsize=TRANSFORM_CACHE_SIZE)
 def _transform_to_4326(srs):
     "Given a string like EPSG:2913, return an OGR transform object to turn it in to EPSG:4326"
-    if srs not in _transform_cache:
-        epsg_id = int(srs[5:]) if srs.startswith("EPSG:") else int(srs)
-        # Manufacture a transform object if it's not in the cache
+    epsg_id = int(srs[5:]) if srs.startswith("EPSG:") else int(srs)
 
-        in_spatial_ref = osr.SpatialReference()
-        in_spatial_ref.ImportFromEPSG(epsg_id)
+    in_spatial_ref = osr.SpatialReference()
+    in_spatial_ref.ImportFromEPSG(epsg_id)
 
-        out_spatial_ref = osr.SpatialReference()
-        out_spatial_ref.ImportFromEPSG(4326)
+    if int(osgeo.__version__[0]) >= 3:
+        # GDAL 3 changes axis order: https://github.com/OSGeo/gdal/issues/1546
+        in_spatial_ref.SetAxisMappingStrategy(osgeo.osr.OAMS_TRADITIONAL_GIS_ORDER)
 
-        if int(osgeo.__version__[0]) >= 3:
-            # GDAL 3 changes axis order: https://github.com/OSGeo/gdal/issues/1546
-            in_spatial_ref.SetAxisMappingStrategy(osgeo.osr.OAMS_TRADITIONAL_GIS_ORDER)
-            out_spatial_ref.SetAxisMappingStrategy(osgeo.osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return osr.CoordinateTransformation(in_spatial_ref, _spatial_ref_4326())
 
-        _transform_cache[srs] = osr.CoordinateTransformation(in_spatial_ref, out_spatial_ref)
-    return _transform_cache[srs]
+@functools.lru_cache(maxsize=TRANSFORM_CACHE_SIZE)
+def _ogr_transform_to_4326(epsg_id):
+    ''' Given an EPSG code, return an OGR transform object for OGR source geometries.
 
-def row_extract_and_reproject(source_config, source_row):
-    ''' Find geometries in source CSV data and store it in ESPG:4326
+        Unlike _transform_to_4326(), the source axis order is left to OGR.
     '''
-    data_source = source_config.data_source
+    in_spatial_ref = osr.SpatialReference()
+    in_spatial_ref.ImportFromEPSG(epsg_id)
 
-    format_string = data_source["conform"].get('format')
-    protocol_string = data_source['protocol']
+    return osr.CoordinateTransformation(in_spatial_ref, _spatial_ref_4326())
 
-    # Prepare an output row
-    out_row = copy.deepcopy(source_row)
-
-    source_geom = None
-
-    # Set local variables lon_name, source_x, lat_name, source_y
-    if source_row.get(GEOM_FIELDNAME) is not None:
-        source_geom = source_row[GEOM_FIELDNAME]
-    elif source_row.get(GEOM_FIELDNAME.replace('GEOM', 'geom')):
-        source_row[GEOM_FIELDNAME] = source_row[GEOM_FIELDNAME.replace('GEOM', 'geom')]
-        source_geom = source_row[GEOM_FIELDNAME]
+def extract_and_reproject_settings(source_config):
+    ''' Look up the conform settings row_extract_and_reproject() needs.
 
-    if source_row.get(GEOM_FIELDNAME.replace('GEOM', 'geom')) is not None:
-        del out_row[GEOM_FIELDNAME.replace('GEOM', 'geom')]
+        Returns a tuple for extract_and_reproject_row(), so that callers
+        converting a whole file can do these lookups once instead of per row.
+    '''
+    conform = source_config.data_source["conform"]
 
-    if source_geom == "POINT (nan nan)":
-        out_row[GEOM_FIELDNAME] = None
-        return out_row
+    lat_name, lon_name = conform.get('lat'), conform.get('lon')
+    has_lat_lon = lat_name is not None and lon_name is not None
+    needs_reproject = "srs" in conform and conform["srs"] != "EPSG:4326"
 
-    if source_geom is None and data_source["conform"].get('lat') is not None and data_source["conform"].get('lon') is not None:
-        # Conforms can name the lat/lon columns from the original source data
-        lat_name = data_source["conform"]["lat"]
-        lon_name = data_source["conform"]["lon"]
+    return (lat_name, lon_name, has_lat_lon, needs_reproject,
+            conform.get("srs"), source_config.layer == "addresses")
 
-        source_x = source_row[lon_name]
-        source_y = source_row[lat_name]
+def row_extract_and_reproject(source_config, source_row):
+    ''' Find geometries in source CSV data and store it in ESPG:4326
+    '''
+    settings = extract_and_reproject_settings(source_config)
+    return extract_and_reproject_row(source_row, *settings)
 
-        # Remove lat/lng name from output row
-        for n in (lon_name, lat_name):
-            out_row.pop(n, None)
+def lat_lon_geometry(source_x, source_y):
+    ''' Return a WKT point for source longitude and latitude strings, or None if blank.
+    '''
+    # Convert commas to periods for decimal numbers. (Not using locale.)
+    try:
+        source_x = source_x.replace(',', '.')
+        source_y = source_y.replace(',', '.')
+    except AttributeError:
+        return None
 
-        # Convert commas to periods for decimal numbers. (Not using locale.)
-        try:
-            source_x = source_x.replace(',', '.')
-            source_y = source_y.replace(',', '.')
+    if source_x == "" or source_y == "":
+        return None
 
-            source_geom = "POINT ({} {})".format(source_x, source_y)
+    return "POINT ({} {})".format(source_x, source_y)
 
-            if source_x == "" or source_y == "":
-                out_row[GEOM_FIELDNAME] = None
-                return out_row
-        except AttributeError:
-            # Add blank data to the output CSV and get out
-            out_row[GEOM_FIELDNAME] = None
-            return out_row
+def reproject_geometry(source_geom, needs_reproject, srs, is_addresses):
+    ''' Return source WKT in EPSG:4326, reduced to a point on surface for addresses.
+    '''
+    geom = None
 
     # Reproject the coordinates if necessary
-    if "srs" in data_source["conform"] and data_source["conform"]["srs"] != "EPSG:4326":
+    if needs_reproject:
         try:
-            srs = data_source["conform"]["srs"]
             geom = ogr.CreateGeometryFromWkt(source_geom)
             geom.Transform(_transform_to_4326(srs))
-            source_geom = geom.ExportToWkt()
         except (TypeError, ValueError) as e:
-            if not (source_x == "" or source_y == ""):
-                _L.debug("Could not reproject %s %s in SRS %s", source_x, source_y, srs)
+            geom = None
+            _L.debug("Could not reproject %s in SRS %s", source_geom, srs)
 
     # For Addresses - Calculate the centroid on surface of the geometry and write it as X and Y columns
-    if source_config.layer == "addresses":
-        geom = ogr.CreateGeometryFromWkt(source_geom)
+    if is_addresses:
+        if geom is None:
+            geom = ogr.CreateGeometryFromWkt(source_geom)
 
         try:
             centroid = geom.PointOnSurface()
@@ -797,36 +1111,59 @@ def row_extract_and_reproject(source_config, source_row):
 
         source_geom = centroid.ExportToWkt()
 
-    out_row[GEOM_FIELDNAME] = source_geom
+    elif geom is not None:
+        source_geom = geom.ExportToWkt()
+
+    return source_geom
+
+def extract_and_reproject_row(source_row, lat_name, lon_name, has_lat_lon,
+                              needs_reproject, srs, is_addresses):
+    ''' Find geometries in source CSV data and store it in ESPG:4326
+
+        Takes settings from extract_and_reproject_settings().
+    '''
+    # Prepare an output row
+    # Source values are all flat strings, so a shallow copy is enough.
+    out_row = dict(source_row)
+
+    # Set local variables lon_name, source_x, lat_name, source_y
+    source_geom = out_row.pop(GEOM_FIELDNAME, None)
+
+    if source_geom == "POINT (nan nan)":
+        out_row[GEOM_FIELDNAME] = None
+        return out_row
+
+    if source_geom is not None and not (needs_reproject or is_addresses):
+        # Geometry such as ESRI's is already in EPSG:4326 and used as-is
+        out_row[GEOM_FIELDNAME] = source_geom
+        return out_row
+
+    if source_geom is None and has_lat_lon:
+        # Conforms can name the lat/lon columns from the original source data
+        source_x = source_row[lon_name]
+        source_y = source_row[lat_name]
+
+        # Remove lat/lng name from output row
+        for n in (lon_name, lat_name):
+            out_row.pop(n, None)
+
+        source_geom = lat_lon_geometry(source_x, source_y)
+
+        if source_geom is None:
+            # Add blank data to the output CSV and get out
+            out_row[GEOM_FIELDNAME] = None
+            return out_row
+
+    out_row[GEOM_FIELDNAME] = reproject_geometry(source_geom, needs_reproject, srs, is_addresses)
 
     # Add the reprojected data to the output CSV
     return out_row
 
 
 def row_function(sc, row, key, fxn):
-    function = fxn["function"]
-    if function == "join":
-        row = row_fxn_join(sc, row, key, fxn)
-    elif function == "regexp":
-        row = row_fxn_regexp(sc, row, key, fxn)
-    elif function == "format":
-        row = row_fxn_format(sc, row, key, fxn)
-    elif function == "prefixed_number":
-        row = row_fxn_prefixed_number(sc, row, key, fxn)
-    elif function == "postfixed_street":
-        row = row_fxn_postfixed_street(sc, row, key, fxn)
-    elif function == "postfixed_unit":
-        row = row_fxn_postfixed_unit(sc, row, key, fxn)
-    elif function == "remove_prefix":
-        row = row_fxn_remove_prefix(sc, row, key, fxn)
-    elif function == "remove_postfix":
-        row = row_fxn_remove_postfix(sc, row, key, fxn)
-    elif function == "chain":
-        row = row_fxn_chain(sc, row, key, fxn)
-    elif function == "first_non_empty":
-        row = row_fxn_first_non_empty(sc, row, key, fxn)
-    elif function == "constant":
-        row = row_fxn_constant(sc, row, key, fxn)
+    function = ROW_FUNCTIONS.get(fxn["function"])
+    if function is not None:
+        row = function(sc, row, key, fxn)
 
     return row
 
@@ -834,19 +1171,40 @@ def row_function(sc, row, key, fxn):
 
 ### Row-level conform code. Inputs and outputs are individual rows in a CSV file.
 ### The input row may or may not be modified in place. The output row is always returned.
-def row_transform_and_convert(source_config, row):
-    "Apply the full conform transform and extract operations to a row"
+def conform_steps(source_config):
+    ''' Resolve the conform object into a list of row processing steps.
 
-    c = source_config.data_source["conform"]
+        Each step takes a row and returns it, so the schema check and
+        function dispatch happen once per source instead of once per row.
+    '''
+    steps = []
 
     "Attribute tags can utilize processing fxns"
-    for k, v in c.items():
-        if k in source_config.SCHEMA and isinstance(v, list):
+    for k, v in source_config.data_source["conform"].items():
+        if k not in source_config.SCHEMA:
+            continue
+        if isinstance(v, list):
             "Lists are a concat shortcut to concat fields with spaces"
-            row = row_merge(source_config, row, k)
-        if k in source_config.SCHEMA and isinstance(v, dict):
+            steps.append(functools.partial(row_merge, source_config, key=k))
+        elif isinstance(v, dict):
             "Dicts are custom processing functions"
-            row = row_function(source_config, row, k, v)
+            function = ROW_FUNCTIONS.get(v["function"])
+            if function is not None:
+                steps.append(functools.partial(function, source_config, key=k, fxn=v))
+
+    return steps
+
+def row_transform_and_convert(source_config, row, steps=None):
+    ''' Apply the full conform transform and extract operations to a row
+
+        steps: optional result of conform_steps(source_config), for
+        callers converting many rows from the same source.
+    '''
+    if steps is None:
+        steps = conform_steps(source_config)
+
+    for step in steps:
+        row = step(row)
 
     # Make up a random fingerprint if none exists
     cache_fingerprint = source_config.data_source.get('fingerprint', str(uuid4()))
@@ -865,8 +1223,8 @@ def row_transform_and_convert(source_config, row):
 
 def row_merge(sc, row, key):
     "Merge multiple columns like 'Maple','St' to 'Maple St'"
-    merge_data = [row[field] for field in sc.data_source["conform"][key]]
-    row["oa:{}".format(key)] = ' '.join(merge_data)
+    fields = sc.data_source["conform"][key]
+    row["oa:{}".format(key)] = ' '.join([row[field] for field in fields])
     return row
 
 def row_fxn_join(sc, row, key, fxn):
@@ -881,10 +1239,9 @@ def row_fxn_join(sc, row, key, fxn):
 
 def row_fxn_regexp(sc, row, key, fxn):
     "Split addresses like '123 Maple St' into '123' and 'Maple St'"
-    pattern = re.compile(fxn.get("pattern", False))
-    replace = fxn.get('replace', False)
+    pattern, replace = _compile_regexp_function(fxn.get("pattern", False), fxn.get('replace', False))
     if replace:
-        match = re.sub(pattern, convert_regexp_replace(replace), row[fxn["field"]])
+        match = pattern.sub(replace, row[fxn["field"]])
         row["oa:{}".format(key)] = match;
     else:
         match = pattern.search(row[fxn["field"]])
@@ -941,8 +1298,6 @@ def row_fxn_remove_postfix(sc, row, key, fxn):
 
 def row_fxn_format(sc, row, key, fxn):
     "Format multiple fields using a user-specified format string"
-    format_var_pattern = re.compile('\$([0-9]+)')
-
     fields = [(row[n] or u'').strip() for n in fxn["fields"]]
 
     parts = []
@@ -1020,6 +1375,21 @@ def row_fxn_constant(sc, row, key, fxn):
 
     return row
 
+# Conform function names and the row functions that apply them
+ROW_FUNCTIONS = {
+    "join": row_fxn_join,
+    "regexp": row_fxn_regexp,
+    "format": row_fxn_format,
+    "prefixed_number": row_fxn_prefixed_number,
+    "postfixed_street": row_fxn_postfixed_street,
+    "postfixed_unit": row_fxn_postfixed_unit,
+    "remove_prefix": row_fxn_remove_prefix,
+    "remove_postfix": row_fxn_remove_postfix,
+    "chain": row_fxn_chain,
+    "first_non_empty": row_fxn_first_non_empty,
+    "constant": row_fxn_constant,
+}
+
 def row_canonicalize_unit_and_number(sc, row):
     "Canonicalize address unit and number"
     row["unit"] = (row.get("unit", '') or '').strip()
@@ -1041,17 +1411,44 @@ def set_precision(coords, precision):
 
     return result
 
+def row_hash_json(items):
+    ''' Serialize sorted row items to the compact, ASCII-escaped JSON bytes hashed for oa:hash.
+
+        orjson is used when its output is certain to match json.dumps byte
+        for byte: only string or null values, and nothing it leaves
+        unescaped that json.dumps would escape.
+    '''
+    if orjson is not None and all(isinstance(value, str) or value is None for (key, value) in items):
+        try:
+            data = orjson.dumps(items)
+        except TypeError:
+            pass
+        else:
+            if data.isascii() and b'\x7f' not in data:
+                return data
+
+    return json.dumps(items, separators=(',', ':')).encode('utf8')
+
 def row_calculate_hash(cache_fingerprint, row):
     ''' Calculate row hash based on content and existing fingerprint.
 
         16 chars of SHA-1 gives a 64-bit value, plenty for all addresses.
     '''
     hash = sha1(cache_fingerprint.encode('utf8'))
-    hash.update(json.dumps(sorted(row.items()), separators=(',', ':')).encode('utf8'))
+    hash.update(row_hash_json(sorted(row.items())))
     row.update({'oa:hash': hash.hexdigest()[:16]})
 
     return row
 
+def wkt_geometry_mapping(wkt):
+    "Convert WKT to a GeoJSON-like geometry dict, parsing plain points directly"
+    match = wkt_point_pattern.match(wkt)
+
+    if match is None:
+        return mapping(wkt_loads(wkt))
+
+    return {"type": "Point", "coordinates": (float(match.group(1)), float(match.group(2)))}
+
 def row_convert_to_out(source_config, row):
     "Convert a row from the source schema to OpenAddresses output schema"
 
@@ -1066,25 +1463,28 @@ def row_convert_to_out(source_config, row):
     }
 
     if output["geometry"] is not None:
-        wkt_parsed = wkt_loads(output["geometry"])
-        output["geometry"] = mapping(wkt_parsed)
+        output["geometry"] = wkt_geometry_mapping(output["geometry"])
+
+    conform = source_config.data_source['conform']
+    properties = output["properties"]
 
     for field in source_config.SCHEMA:
-        if row.get('oa:{}'.format(field)) is not None:
+        value = row.get('oa:' + field)
+        if value is not None:
             # If there is an OA prefix, it is not a native field and was compiled
             # via an attrib function or concatenation
-            output["properties"][field] = row.get('oa:{}'.format(field))
+            properties[field] = value
         else:
             # Get a native field as specified in the conform object
-            cfield = source_config.data_source['conform'].get(field)
+            cfield = conform.get(field)
 
             # If the field is a string, it is a direct mapping to the source
             # It might not be a string if it's a function that failed to
             # resolve to an oa:-prefixed field.
             if cfield and isinstance(cfield, str):
-                output["properties"][field] = row.get(cfield)
+                properties[field] = row.get(cfield)
             else:
-                output["properties"][field] = ''
+                properties[field] = ''
 
     return output
 
@@ -1118,22 +1518,102 @@ def extract_to_source_csv(source_config, source_path, extract_path):
     else:
         raise Exception("Unsupported source format %s" % format_string)
 
-def transform_to_out_geojson(source_config, extract_path, dest_path):
+def conform_processes():
+    ''' Get the number of conform worker processes from the environment.
+
+        Never more than os.cpu_count(), and 1 to apply conform rules inline.
+    '''
+    cpu_count = os.cpu_count() or 1
+    value = os.environ.get(CONFORM_PROCESSES_VAR, '').strip().lower()
+
+    if value == '':
+        return 1
+    elif value == 'auto':
+        return cpu_count
+
+    try:
+        return max(1, min(int(value), cpu_count))
+    except ValueError:
+        _L.warning('Ignoring %s=%r, expected a number or "auto"', CONFORM_PROCESSES_VAR, value)
+        return 1
+
+# Source config and extract header for batches in a conform worker process
+_worker_batch_args = None
+
+def _init_conform_worker(source_config, fieldnames):
+    global _worker_batch_args
+    _worker_batch_args = source_config, fieldnames
+
+def _conform_worker_batch(rows):
+    return transform_rows_to_geojson(*_worker_batch_args, rows)
+
+def transform_rows_to_geojson(source_config, fieldnames, rows):
+    ''' Apply conform rules to a batch of extracted CSV rows.
+
+        Returns the output GeoJSON features as newline-terminated lines.
+    '''
+    lines = []
+    steps = conform_steps(source_config)
+
+    for values in rows:
+        extract_row = dict(zip(fieldnames, values))
+        out_row = row_transform_and_convert(source_config, extract_row, steps)
+        lines.append(json.dumps(out_row) + '\n')
+
+    return ''.join(lines)
+
+def transform_to_out_geojson(source_config, extract_path, dest_path, processes=None):
     ''' Transform an extracted source CSV to the OpenAddresses output GeoJSON by applying conform rules.
 
         source_config: description of the source, containing the conform object
         extract_path: extracted CSV file to process
         dest_path: path for output file in OpenAddress CSV
+        processes: worker processes to use, default from conform_processes()
+
+        With more than one process, extracts larger than one batch are
+        spread over workers, with output kept in source order.
     '''
     # Read through the extract CSV
     with open(extract_path, 'r', encoding='utf-8') as extract_fp:
-        reader = csv.DictReader(extract_fp)
+        # Extracts are written with a value for every column, so rows can
+        # be zipped with the header rather than going through DictReader.
+        reader = csv.reader(extract_fp)
+        fieldnames = next(reader, [])
+
+        # Batches of non-empty rows, read only as fast as they are written
+        rows = (values for values in reader if values)
+        batches = iter(lambda: list(itertools.islice(rows, CONFORM_BATCH_SIZE)), [])
+
         # Write to the destination GeoJSON
-        with open(dest_path, 'w', encoding='utf-8') as dest_fp:
-            # For every row in the extract
-            for extract_row in reader:
-                out_row = row_transform_and_convert(source_config, extract_row)
-                dest_fp.write(json.dumps(out_row) + '\n')
+        with open(dest_path, 'w', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE) as dest_fp:
+            first_batch = next(batches, [])
+            second_batch = next(batches, None)
+            workers = conform_processes() if processes is None else processes
+
+            if second_batch is None or workers <= 1:
+                # Small extracts are not worth starting processes for
+                for batch in itertools.chain([first_batch], [second_batch] if second_batch else [], batches):
+                    dest_fp.write(transform_rows_to_geojson(source_config, fieldnames, batch))
+
+            else:
+                # Workers are spawned rather than forked from this process,
+                # which may already be running threads, and get the source
+                # config once instead of with every batch.
+                with ProcessPoolExecutor(max_workers=workers,
+                                         mp_context=multiprocessing.get_context('spawn'),
+                                         initializer=_init_conform_worker,
+                                         initargs=(source_config, fieldnames)) as executor:
+                    # Bound the batches in flight so memory does not grow with the extract
+                    pending = deque()
+
+                    for batch in itertools.chain([first_batch, second_batch], batches):
+                        pending.append(executor.submit(_conform_worker_batch, batch))
+
+                        if len(pending) >= workers * 2:
+                            dest_fp.write(pending.popleft().result())
+
+                    while pending:
+                        dest_fp.write(pending.popleft().result())
 
 def conform_cli(source_config, source_path, dest_path):
     "Command line entry point for conforming a downloaded source to an output CSV."
@@ -1,27 +1,32 @@
 from __future__ import absolute_import, division, print_function
 
-import json, ijson
-from itertools import chain
+import json
 
-def _build_value(data):
-    ''' Build a value (number, array, whatever) from an ijson stream.
+try:
+    # ijson's compiled yajl2 backend parses much faster when it is available
+    import ijson.backends.yajl2_c as ijson
+except ImportError:
+    import ijson
+
+def _build_value(prefix, event, value, data):
+    ''' Build a value (number, array, whatever) starting from one ijson event.
     '''
-    for (prefix, event, value) in data:
-        if event in ('string', 'null', 'boolean'):
-            return value
+    if event in ('string', 'null', 'boolean'):
+        return value
 
-        elif event == 'number':
-            return int(value) if (int(value) == float(value)) else float(value)
+    elif event == 'number':
+        int_value, float_value = int(value), float(value)
+        return int_value if (int_value == float_value) else float_value
 
-        elif event == 'start_array':
-            return _build_list(data)
+    elif event == 'start_array':
+        return _build_list(data)
 
-        elif event == 'start_map':
-            return _build_map(data)
+    elif event == 'start_map':
+        return _build_map(data)
 
-        else:
-            # MOOP.
-            raise ValueError((prefix, event, value))
+    else:
+        # MOOP.
+        raise ValueError((prefix, event, value))
 
 def _build_list(data):
     ''' Build a list from an ijson stream.
@@ -36,8 +41,7 @@ def _build_list(data):
 
         else:
             # let _build_value() handle the array item.
-            _data = chain([(prefix, event, value)], data)
-            output.append(_build_value(_data))
+            output.append(_build_value(prefix, event, value, data))
 
     return output
 
@@ -53,7 +57,7 @@ def _build_map(data):
             break
 
         elif event == 'map_key':
-            output[value] = _build_value(data)
+            output[value] = _build_value(*next(data), data)
 
         else:
             # MOOP.
@@ -91,6 +95,5 @@ def stream_geojson(stream):
                         break
 
                     # let _build_value() handle the feature.
-                    _data = chain([(prefix5, event5, value5)], data)
-                    feature = _build_value(_data)
+                    feature = _build_value(prefix5, event5, value5, data)
                     yield feature
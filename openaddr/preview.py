@@ -1,10 +1,14 @@
 import logging; _L = logging.getLogger('openaddr.preview')
 
-from math import sqrt, pi, log
+from math import pi, log
+from os.path import join, dirname, exists
+from tempfile import mkstemp
 from argparse import ArgumentParser
-import json, itertools
+from concurrent.futures import ThreadPoolExecutor
+import os, json, itertools, struct, array, threading
 
-import requests, uritemplate, mapbox_vector_tile
+import numpy, requests, uritemplate, mapbox_vector_tile
+from requests.adapters import HTTPAdapter
 
 from osgeo import osr, ogr
 
@@ -14,21 +18,41 @@ except ImportError:
     # http://stackoverflow.com/questions/11491268/install-pycairo-in-virtualenv
     import cairocffi as cairo
 
+try:
+    # orjson is an optional, faster parser for GeoJSON+LD lines
+    import orjson
+except ImportError:
+    orjson = None
+
 TILE_URL = 'https://api.protomaps.com/tiles/v4/{z}/{x}/{y}.mvt{?key}'
 EARTH_DIAMETER = 6378137 * 2 * pi
 FORMAT = 'ff'
 
+# Number of map tiles fetched and decoded at once
+TILE_THREADS = 8
+
+# Coordinate transformations are reused, but GDAL does not allow one to be
+# shared between threads
+_projections = threading.local()
+
+# Vector tile layers drawn under previews, other layers are never decoded
+TILE_LAYERS = {'landuse', 'water', 'roads'}
+
+# Shared across tile requests so connections to the tile server are reused
+_http_session = requests.Session()
+_http_session.mount('https://', HTTPAdapter(pool_connections=TILE_THREADS, pool_maxsize=TILE_THREADS))
+
 # WGS 84, http://spatialreference.org/ref/epsg/4326/
 EPSG4326 = '+proj=longlat +ellps=WGS84 +datum=WGS84 +no_defs'
 
 # Web Mercator, https://trac.osgeo.org/openlayers/wiki/SphericalMercator
 EPSG900913 = '+proj=merc +a=6378137 +b=6378137 +lat_ts=0.0 +lon_0=0.0 +x_0=0.0 +y_0=0 +k=1.0 +units=m +nadgrids=@null +no_defs'
 
-def render(src_filename, png_filename, width, resolution, protomaps_key):
+def render(src_filename, png_filename, width, resolution, protomaps_key, tile_cache_dir=None):
     '''
     '''
     try:
-        xmin, ymin, xmax, ymax = calculate_bounds(src_filename)
+        xmin, ymin, xmax, ymax = calculate_bounds(read_surface_points(src_filename))
     except:
         raise
 
@@ -55,7 +79,7 @@ def render(src_filename, png_filename, width, resolution, protomaps_key):
     context.fill()
 
     landuse_geoms, water_geoms, roads_geoms = \
-        get_map_features(xmin, ymin, xmax, ymax, resolution, scale, protomaps_key)
+        get_map_features(xmin, ymin, xmax, ymax, resolution, scale, protomaps_key, tile_cache_dir)
 
     fill_geometries(context, landuse_geoms, muppx, park_fill)
     fill_geometries(context, water_geoms, muppx, water_fill)
@@ -88,14 +112,12 @@ def iterate_file_geoms(filename):
     ''' Stream Geometries from an input GeoJSON+LD File
     '''
 
-    with open(filename, 'r') as file:
+    with open(filename, 'rb') as file:
         project = get_projection()
 
         for line in file:
             try:
-                line = json.loads(line)
-
-                geom = ogr.CreateGeometryFromJson(json.dumps(line['geometry']))
+                geom = ogr.CreateGeometryFromJson(feature_geometry_json(line))
 
                 geom.Transform(project)
 
@@ -104,10 +126,23 @@ def iterate_file_geoms(filename):
                 print('ERROR', e)
                 continue
 
-    del project, geom
-
-def get_map_features(xmin, ymin, xmax, ymax, resolution, scale, protomaps_key):
+def feature_geometry_json(line):
+    ''' Get the geometry of one GeoJSON+LD feature line as a JSON string.
     '''
+    if orjson is not None:
+        try:
+            return orjson.dumps(orjson.loads(line)['geometry']).decode('utf-8')
+        except (orjson.JSONDecodeError, TypeError):
+            # e.g. NaN or integers beyond 64 bits, which json still accepts
+            pass
+
+    return json.dumps(json.loads(line)['geometry'])
+
+def get_map_features(xmin, ymin, xmax, ymax, resolution, scale, protomaps_key, tile_cache_dir=None):
+    ''' Get landuse, water, and road geometries from map tiles.
+
+        Encoded tiles are kept under optional tile_cache_dir by z/x/y
+        and reused on later calls without a request.
     '''
     zoom = round(calculate_zoom(scale, resolution))
     mincol = 2**zoom * (xmin + EARTH_DIAMETER/2) / EARTH_DIAMETER
@@ -115,8 +150,8 @@ def get_map_features(xmin, ymin, xmax, ymax, resolution, scale, protomaps_key):
     maxcol = 2**zoom * (xmax + EARTH_DIAMETER/2) / EARTH_DIAMETER
     maxrow = 2**zoom * (EARTH_DIAMETER/2 - ymin) / EARTH_DIAMETER
 
-    row_cols = itertools.product(range(int(minrow), int(maxrow) + 1),
-                                 range(int(mincol), int(maxcol) + 1))
+    row_cols = list(itertools.product(range(int(minrow), int(maxrow) + 1),
+                                      range(int(mincol), int(maxcol) + 1)))
 
     landuse_geoms, water_geoms, roads_geoms = list(), list(), list()
 
@@ -138,30 +173,59 @@ def get_map_features(xmin, ymin, xmax, ymax, resolution, scale, protomaps_key):
 
     def projected_geom(geometry, mx, bx, my, by):
         ''' Get an OGR geometry for a tiled GeoJSON-like geometry.
+
+            Vertices are transformed a whole ring at a time and packed
+            straight into little-endian WKB for OGR.
         '''
+        scale, offset = numpy.array([mx, my]), numpy.array([bx, by])
+
+        def ring_wkb(ring):
+            points = numpy.asarray(ring, dtype=numpy.float64).reshape(-1, 2) * scale + offset
+            return struct.pack('<I', len(points)) + points.astype('<f8').tobytes()
+
+        def linestring_wkb(line):
+            return struct.pack('<BI', 1, ogr.wkbLineString) + ring_wkb(line)
+
+        def polygon_wkb(rings):
+            return struct.pack('<BII', 1, ogr.wkbPolygon, len(rings)) \
+                + b''.join(ring_wkb(ring) for ring in rings)
+
         if geometry['type'] in ('MultiPolygon', ):
-            coordinates = [[[(mx * x + bx, my * y + by)
-                for (x, y) in ring] for ring in part] for part in geometry['coordinates']]
-        elif geometry['type'] in ('Polygon', 'MultiLineString'):
-            coordinates = [[(mx * x + bx, my * y + by)
-                for (x, y) in part] for part in geometry['coordinates']]
+            wkb = struct.pack('<BII', 1, ogr.wkbMultiPolygon, len(geometry['coordinates'])) \
+                + b''.join(polygon_wkb(part) for part in geometry['coordinates'])
+        elif geometry['type'] in ('Polygon', ):
+            wkb = polygon_wkb(geometry['coordinates'])
+        elif geometry['type'] in ('MultiLineString', ):
+            wkb = struct.pack('<BII', 1, ogr.wkbMultiLineString, len(geometry['coordinates'])) \
+                + b''.join(linestring_wkb(part) for part in geometry['coordinates'])
         elif geometry['type'] in ('LineString'):
-            coordinates = [(mx * x + bx, my * y + by)
-                for (x, y) in geometry['coordinates']]
+            wkb = linestring_wkb(geometry['coordinates'])
         else:
             raise ValueError(geometry['type'])
-        geom = ogr.CreateGeometryFromJson(json.dumps(dict(type=geometry['type'], coordinates=coordinates)))
+        geom = ogr.CreateGeometryFromWkb(wkb)
         return geom
 
-    for (row, col) in row_cols:
+    def get_tile(row_col):
+        ''' Get Mercator bounds and decoded contents for one tile.
+        '''
+        row, col = row_col
         url = uritemplate.expand(TILE_URL, dict(z=zoom, x=col, y=row, key=protomaps_key))
 
-        _L.debug('Getting tile {}'.format(url))
+        if tile_cache_dir:
+            cache_path = join(tile_cache_dir, str(zoom), str(col), '{}.mvt'.format(row))
+        else:
+            cache_path = None
 
-        got = requests.get(url)
-        tile = mapbox_vector_tile.decode(got.content)
-        bounds = tile_bounds(row, col, zoom)
+        content = get_tile_content(url, cache_path)
+        tile = mapbox_vector_tile.decode(filter_tile_layers(content, TILE_LAYERS))
+        return tile_bounds(row, col, zoom), tile
 
+    # Tile requests are independent and I/O-bound, so overlap them;
+    # map() keeps tiles in row and column order.
+    with ThreadPoolExecutor(max_workers=max(1, min(TILE_THREADS, len(row_cols)))) as executor:
+        tiles = list(executor.map(get_tile, row_cols))
+
+    for (bounds, tile) in tiles:
         if 'landuse' in tile:
             landuse_xform = get_transform(tile['landuse']['extent'], *bounds)
             for feature in tile['landuse']['features']:
@@ -184,13 +248,94 @@ def get_map_features(xmin, ymin, xmax, ymax, resolution, scale, protomaps_key):
 
     return landuse_geoms, water_geoms, roads_geoms
 
-def get_projection():
+def get_tile_content(url, cache_path):
+    ''' Get encoded tile content, from cache_path if it was saved there.
     '''
+    if cache_path and exists(cache_path):
+        _L.debug('Reading tile {}'.format(cache_path))
+        with open(cache_path, 'rb') as file:
+            return file.read()
+
+    _L.debug('Getting tile {}'.format(url))
+    got = _http_session.get(url)
+
+    if cache_path and got.status_code == 200:
+        # Write then rename so concurrent renders never read a partial tile
+        os.makedirs(dirname(cache_path), exist_ok=True)
+        handle, temp_path = mkstemp(dir=dirname(cache_path), suffix='.mvt')
+        with os.fdopen(handle, 'wb') as file:
+            file.write(got.content)
+        os.replace(temp_path, cache_path)
+
+    return got.content
+
+def read_varint(data, offset):
+    ''' Read a protobuf base 128 varint, return value and next offset.
     '''
-    osr.UseExceptions()
-    sref_geo = osr.SpatialReference(); sref_geo.ImportFromProj4(EPSG4326)
-    sref_map = osr.SpatialReference(); sref_map.ImportFromProj4(EPSG900913)
-    return osr.CoordinateTransformation(sref_geo, sref_map)
+    value, shift = 0, 0
+
+    while True:
+        byte = data[offset]
+        value |= (byte & 0x7F) << shift
+        offset += 1
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+def iterate_pbf_fields(data):
+    ''' Generate field number, wire type, bounds, and length-delimited value
+        for each top-level field of an encoded protobuf message.
+    '''
+    offset = 0
+
+    while offset < len(data):
+        start, value = offset, None
+        key, offset = read_varint(data, offset)
+        field, wire_type = key >> 3, key & 0x07
+
+        if wire_type == 0:
+            _, offset = read_varint(data, offset)
+        elif wire_type == 1:
+            offset += 8
+        elif wire_type == 2:
+            length, offset = read_varint(data, offset)
+            value = data[offset:offset + length]
+            offset += length
+        elif wire_type == 5:
+            offset += 4
+        else:
+            raise ValueError('Unsupported protobuf wire type {}'.format(wire_type))
+
+        yield field, wire_type, start, offset, value
+
+def filter_tile_layers(data, layer_names):
+    ''' Keep only named layers of an encoded vector tile.
+
+        Layers are tile field 3 and name is layer field 1, see
+        https://github.com/mapbox/vector-tile-spec/blob/master/2.1/vector_tile.proto
+    '''
+    kept = []
+
+    for (field, wire_type, start, end, value) in iterate_pbf_fields(data):
+        if field == 3 and wire_type == 2:
+            names = (bytes(name).decode('utf8') for (f, w, _, _, name)
+                     in iterate_pbf_fields(value) if f == 1 and w == 2)
+            if next(names, None) not in layer_names:
+                continue
+        kept.append(data[start:end])
+
+    return b''.join(kept)
+
+def get_projection():
+    ''' Get WGS 84 to Web Mercator transformation, built once per thread.
+    '''
+    if not hasattr(_projections, 'transform'):
+        osr.UseExceptions()
+        sref_geo = osr.SpatialReference(); sref_geo.ImportFromProj4(EPSG4326)
+        sref_map = osr.SpatialReference(); sref_map.ImportFromProj4(EPSG900913)
+        _projections.transform = osr.CoordinateTransformation(sref_geo, sref_map)
+
+    return _projections.transform
 
 def write_geoms(geoms, geoms_filename):
     ''' Write a stream of geoms into a file of packed values.
@@ -204,33 +349,29 @@ def write_geoms(geoms, geoms_filename):
 
     _L.info('Wrote {} points to {}'.format(count, geoms_filename))
 
-def stats(geoms_filename):
-    ''' Return means and standard deviations for iterator geoms
+def read_surface_points(geoms_filename):
+    ''' Read a point on the surface of each geometry in a GeoJSON+LD file.
 
-        Uses Welford's numerically stable algorithm from
-        https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance#Online_algorithm
+        Returns an (N, 2) array of projected x, y values, small enough to
+        keep in memory where the geometries themselves might not be.
     '''
-    n, xmean, xM2, ymean, yM2 = 0, 0, 0, 0, 0
+    points = array.array('d')
 
     for geom in iterate_file_geoms(geoms_filename):
         (x, y, e) = geom.PointOnSurface().GetPoint()
+        points.extend((x, y))
 
-        n += 1
-
-        xdelta = x - xmean
-        xmean += xdelta / n
-        xM2 += xdelta * (x - xmean)
-
-        ydelta = y - ymean
-        ymean += ydelta / n
-        yM2 += ydelta * (y - ymean)
+    return numpy.frombuffer(points, dtype=numpy.float64).reshape(-1, 2)
 
-    if n < 2:
+def stats(points):
+    ''' Return means and standard deviations for an array of points
+    '''
+    if len(points) < 2:
         raise ValueError()
 
-    xstddev, ystddev = sqrt(xM2 / (n - 1)), sqrt(yM2 / (n - 1))
+    (xmean, ymean), (xstddev, ystddev) = points.mean(axis=0), points.std(axis=0, ddof=1)
 
-    return xmean, xstddev, ymean, ystddev
+    return float(xmean), float(xstddev), float(ymean), float(ystddev)
 
 def calculate_zoom(scale, resolution):
     ''' Calculate web map zoom based on scale.
@@ -240,10 +381,10 @@ def calculate_zoom(scale, resolution):
 
     return zoom
 
-def calculate_bounds(geoms_filename):
+def calculate_bounds(points):
     '''
     '''
-    xmean, xsdev, ymean, ysdev = stats(geoms_filename)
+    xmean, xsdev, ymean, ysdev = stats(points)
 
     # use standard deviation to avoid far-flung mistakes, and look further
     # horizontally to account for Github comment thread image appearance.
@@ -254,9 +395,7 @@ def calculate_bounds(geoms_filename):
     left, right = xmax, xmin
     bottom, top = ymax, ymin
 
-    for geom in iterate_file_geoms(geoms_filename):
-        (x, y, e) = geom.PointOnSurface().GetPoint()
-
+    for (x, y) in points.tolist():
         if xmin <= x <= xmax:
             left, right = min(left, x), max(right, x)
         if ymin <= y <= ymax:
@@ -369,6 +508,9 @@ parser.add_argument('--width', dest='width', type=int,
 parser.add_argument('--protomaps-key', dest='protomaps_key',
                     help='Protomaps API Key. See: https://protomaps.com/dashboard')
 
+parser.add_argument('--tile-cache', dest='tile_cache_dir',
+                    help='Directory to keep downloaded map tiles for later previews.')
+
 parser.add_argument('-v', '--verbose', help='Turn on verbose logging',
                     action='store_const', dest='loglevel',
                     const=logging.DEBUG, default=logging.INFO)
@@ -379,7 +521,7 @@ parser.add_argument('-q', '--quiet', help='Turn off most logging',
 
 def main():
     args = parser.parse_args()
-    render(args.src_geojson, args.png_filename, args.width, args.resolution, args.protomaps_key)
+    render(args.src_geojson, args.png_filename, args.width, args.resolution, args.protomaps_key, args.tile_cache_dir)
 
 if __name__ == '__main__':
     exit(main())
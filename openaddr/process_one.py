@@ -375,6 +375,8 @@ def write_state(source, layer, data_source_name, skipped, destination, log_handl
         ('feat count', conform_result.feat_count),
         ('version', cache_result.version),
         ('fingerprint', cache_result.fingerprint),
+        ('etag', cache_result.etag),
+        ('last modified', cache_result.last_modified),
         ('cache time', cache_result.elapsed and str(cache_result.elapsed)),
         ('processed', conform_result.path and relpath(processed_path2, statedir)),
         ('process time', conform_result.elapsed and str(conform_result.elapsed)),
@@ -397,6 +399,23 @@ def write_state(source, layer, data_source_name, skipped, destination, log_handl
         _L.info(u'Wrote to state: {}'.format(file.name))
         return file.name
 
+def read_state_extras(state_path):
+    ''' Read cache details from an earlier index.json, for use as process() extras.
+
+        A prior cache is only reusable from a URL, not a path in its state directory.
+    '''
+    with open(state_path) as file:
+        state = dict(zip(*json.load(file)))
+
+    extras = {key: state.get(name) for (key, name) in (
+        ('cache', 'cache'), ('fingerprint', 'fingerprint'), ('version', 'version'),
+        ('etag', 'etag'), ('last_modified', 'last modified'))}
+
+    if not urlparse(extras['cache'] or '').scheme:
+        extras['cache'] = None
+
+    return {key: value for (key, value) in extras.items() if value is not None}
+
 parser = ArgumentParser(description='Run one source file locally, prints output path.')
 
 parser.add_argument('source', help='Required source file name.')
@@ -418,6 +437,9 @@ parser.add_argument('--render-preview', help="Render a map preview",
 parser.add_argument('--protomaps-key', dest='protomaps_key',
                     help='Protomaps API Key. See: https://protomaps.com/dashboard')
 
+parser.add_argument('--previous-state', dest='previous_state',
+                    help='index.json from an earlier run, to skip unchanged downloads.')
+
 parser.add_argument('-l', '--logfile', help='Optional log file name.')
 
 parser.add_argument('-v', '--verbose', help='Turn on verbose logging',
@@ -460,11 +482,14 @@ def main():
     csv.field_size_limit(sys.maxsize)
 
     try:
+        extras = read_state_extras(args.previous_state) if args.previous_state else dict()
+
         processed_path = process(args.source, args.destination,
                                  args.layer, args.layersource,
                                  args.render_preview,
                                  args.render_preview,
-                                 protomaps_key=args.protomaps_key)
+                                 protomaps_key=args.protomaps_key,
+                                 extras=extras)
     except Exception as e:
         _L.error(e, exc_info=True)
         return 1
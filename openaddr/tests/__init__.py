@@ -45,7 +45,7 @@ from requests import get
 from httmock import response, HTTMock
 from unittest import mock
 
-from .. import cache, conform, process_one
+from .. import cache, conform, process_one, SourceConfig
 from ..cache import CacheResult
 from ..conform import ConformResult
 from ..process_one import find_source_problem, SourceProblem
@@ -1423,7 +1423,8 @@ class TestState (unittest.TestCase):
 
         cache_result = CacheResult(cache='http://example.com/cache.csv',
                                    fingerprint='ff9900', version='0.0.0',
-                                   elapsed=timedelta(seconds=2))
+                                   elapsed=timedelta(seconds=2), etag='"v1"',
+                                   last_modified='Sat, 01 Jan 2000 00:00:00 GMT')
 
         #
         # Check result of process_one.write_state().
@@ -1447,6 +1448,8 @@ class TestState (unittest.TestCase):
         self.assertEqual(state1['feat count'], 999)
         self.assertEqual(state1['version'], '0.0.0')
         self.assertEqual(state1['fingerprint'], 'ff9900')
+        self.assertEqual(state1['etag'], '"v1"')
+        self.assertEqual(state1['last modified'], 'Sat, 01 Jan 2000 00:00:00 GMT')
         self.assertEqual(state1['cache time'], '0:00:02')
         self.assertEqual(state1['processed'], 'out.zip')
         self.assertEqual(state1['process time'], '0:00:01')
@@ -1467,6 +1470,79 @@ class TestState (unittest.TestCase):
         self.assertEqual(state2['source'], 'bar.json')
         self.assertEqual(state2['skipped'], True)
 
+    def test_cache_validators_round_trip(self):
+        ''' HTTP validators from one run's state revalidate the cache on the next.
+        '''
+        if_none_match = []
+
+        def response_content(url, request):
+            if_none_match.append(request.headers.get('If-None-Match'))
+            if request.headers.get('If-None-Match') == '"v1"':
+                return response(304, b'')
+            return response(200, b'LON,LAT\n-122.2,37.8\n', headers={'Content-Type': 'text/csv',
+                'ETag': '"v1"', 'Last-Modified': 'Sat, 01 Jan 2000 00:00:00 GMT'})
+
+        def source_config():
+            return SourceConfig({'layers': {'addresses': [{
+                'name': 'default', 'protocol': 'http', 'data': 'http://example.com/data.csv',
+                'conform': {'format': 'csv', 'lon': 'LON', 'lat': 'LAT'}
+            }]}}, 'addresses', 'default')
+
+        with HTTMock(response_content):
+            cache_result1 = cache(source_config(), self.output_dir, {})
+
+        self.assertEqual(cache_result1.todict()['etag'], '"v1"')
+        self.assertEqual(cache_result1.todict()['last_modified'], 'Sat, 01 Jan 2000 00:00:00 GMT')
+
+        # Published caches are reused from their URL on later runs
+        cache_result1.cache = 'http://example.com/cache.csv'
+
+        log_handler = mock.Mock()
+
+        with open(join(self.output_dir, 'log-handler-stream.txt'), 'w') as file:
+            log_handler.stream.name = file.name
+
+        state_path = process_one.write_state('sources/foo.json', 'addresses', 'default', False,
+            self.output_dir, log_handler, True, cache_result1, ConformResult.empty(),
+            None, None, self.output_dir)
+
+        extras = process_one.read_state_extras(state_path)
+
+        self.assertEqual(extras, {'cache': 'http://example.com/cache.csv',
+            'fingerprint': cache_result1.fingerprint, 'etag': '"v1"',
+            'last_modified': 'Sat, 01 Jan 2000 00:00:00 GMT'})
+
+        with HTTMock(response_content):
+            cache_result2 = cache(source_config(), self.output_dir, extras)
+
+        self.assertEqual(if_none_match, [None, '"v1"'])
+        self.assertEqual(cache_result2.cache, 'http://example.com/cache.csv')
+        self.assertEqual(cache_result2.fingerprint, cache_result1.fingerprint)
+        self.assertEqual(cache_result2.etag, '"v1"')
+
+    def test_cache_validators_not_carried_forward(self):
+        ''' Validators from extras are dropped when new data comes without any.
+        '''
+        def response_content(url, request):
+            return response(200, b'LON,LAT\n-122.2,37.8\n', headers={'Content-Type': 'text/csv'})
+
+        source_config = SourceConfig({'layers': {'addresses': [{
+            'name': 'default', 'protocol': 'http', 'data': 'http://example.com/data.csv',
+            'conform': {'format': 'csv', 'lon': 'LON', 'lat': 'LAT'}
+        }]}}, 'addresses', 'default')
+
+        extras = {'cache': 'http://example.com/cache.csv', 'fingerprint': 'ff9900',
+            'etag': '"v0"', 'last_modified': 'Fri, 31 Dec 1999 00:00:00 GMT'}
+
+        with HTTMock(response_content):
+            cache_result = cache(source_config, self.output_dir, extras)
+
+        self.assertNotEqual(cache_result.fingerprint, 'ff9900')
+        self.assertIsNone(cache_result.etag)
+        self.assertIsNone(cache_result.last_modified)
+        self.assertNotIn('etag', source_config.data_source)
+        self.assertNotIn('last_modified', source_config.data_source)
+
     def test_find_source_problem(self):
         '''
         '''
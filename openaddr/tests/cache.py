@@ -16,7 +16,98 @@ import unittest
 import httmock
 import tempfile
 
-from ..cache import guess_url_file_extension, EsriRestDownloadTask
+from shapely.geometry import shape
+
+from ..cache import (
+    guess_url_file_extension, guess_content_file_extension, compare_cache_details, conditional_headers,
+    MIME_SNIFF_SIZE,
+    geometry_wkt, EsriRestDownloadTask, URLDownloadTask, NotModified,
+)
+
+class TestCacheFingerprint (unittest.TestCase):
+
+    def setUp(self):
+        self.testdir = tempfile.mkdtemp(prefix='TestCacheFingerprint-')
+
+    def tearDown(self):
+        shutil.rmtree(self.testdir)
+
+    def write_cache_file(self):
+        filepath = join(self.testdir, 'cache.csv')
+        with open(filepath, 'wb') as file:
+            file.write(b'LON,LAT,NUMBER,STREET\n-122.2,37.8,1,MAIN ST\n')
+        return filepath
+
+    def test_default_md5(self):
+        resultdir = join(self.testdir, 'result')
+        cache, fingerprint = compare_cache_details(self.write_cache_file(), resultdir, {})
+
+        self.assertEqual(fingerprint, 'ce1b38260dd589c569fa558357714c87')
+        self.assertEqual(cache, 'file://' + join(resultdir, 'cache.csv'))
+
+    def test_blake2b(self):
+        resultdir = join(self.testdir, 'result')
+        _, fingerprint = compare_cache_details(self.write_cache_file(), resultdir, {'fingerprint_algo': 'blake2b'})
+
+        self.assertEqual(fingerprint, '59b3414134d4758208e5b6f23a1c98e1')
+
+    def test_sha256(self):
+        resultdir = join(self.testdir, 'result')
+        _, fingerprint = compare_cache_details(self.write_cache_file(), resultdir, {'fingerprint_algo': 'sha256'})
+
+        self.assertEqual(fingerprint, 'c5c219655b34ceb121fc591b68b9a1ef')
+
+    def test_unchanged_http_cache(self):
+        data = {'cache': 'http://example.com/cache.csv', 'fingerprint': 'ce1b38260dd589c569fa558357714c87'}
+        cache, fingerprint = compare_cache_details(self.write_cache_file(), join(self.testdir, 'result'), data)
+
+        self.assertEqual((cache, fingerprint), (data['cache'], data['fingerprint']))
+
+    def test_unknown_algorithm(self):
+        with self.assertRaises(ValueError):
+            compare_cache_details(self.write_cache_file(), join(self.testdir, 'result'), {'fingerprint_algo': 'crc32'})
+
+class TestCacheURLDownload (unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='TestCacheURLDownload-')
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def response_content(self, url, request):
+        ''' Fake HTTP responses for use with HTTMock in tests.
+        '''
+        if request.headers.get('If-None-Match') == '"v1"':
+            return httmock.response(304, b'')
+
+        return httmock.response(200, b'LON,LAT\n-122.2,37.8\n',
+            headers={'Content-Type': 'text/csv', 'ETag': '"v1"', 'Last-Modified': 'Sat, 01 Jan 2000 00:00:00 GMT'})
+
+    def test_conditional_headers(self):
+        data = {'cache': 'http://example.com/cache.csv', 'fingerprint': 'ce1b38260dd589c569fa558357714c87',
+                'etag': '"v1"', 'last_modified': 'Sat, 01 Jan 2000 00:00:00 GMT'}
+
+        self.assertEqual(conditional_headers(data), {'If-None-Match': '"v1"', 'If-Modified-Since': 'Sat, 01 Jan 2000 00:00:00 GMT'})
+        self.assertEqual(conditional_headers(dict(data, cache='file:///tmp/cache.csv')), {})
+        self.assertEqual(conditional_headers({'etag': '"v1"'}), {})
+
+    def test_download_records_validators(self):
+        task = URLDownloadTask(None)
+
+        with httmock.HTTMock(self.response_content):
+            output_files = task.download(['http://example.com/data.csv'], self.workdir, None)
+
+        self.assertEqual(len(output_files), 1)
+        self.assertEqual(task.validators['http://example.com/data.csv'],
+            {'etag': '"v1"', 'last_modified': 'Sat, 01 Jan 2000 00:00:00 GMT'})
+
+    def test_download_not_modified(self):
+        task = URLDownloadTask(None, headers={'If-None-Match': '"v1"'})
+
+        with httmock.HTTMock(self.response_content):
+            with self.assertRaises(NotModified):
+                task.download(['http://example.com/data.csv'], self.workdir, None)
 
 class TestCacheExtensionGuessing (unittest.TestCase):
 
@@ -60,6 +151,16 @@ class TestCacheExtensionGuessing (unittest.TestCase):
             assert guess_url_file_extension('http://dcatlas.dcgis.dc.gov/catalog/download.asp?downloadID=2182&downloadTYPE=ESRI') == '.zip'
             assert guess_url_file_extension('http://data.northcowichan.ca/DataBrowser/DownloadCsv?container=mncowichan&entitySet=PropertyReport&filter=NOFILTER') == '.csv', guess_url_file_extension('http://data.northcowichan.ca/DataBrowser/DownloadCsv?container=mncowichan&entitySet=PropertyReport&filter=NOFILTER')
 
+    def test_sniffed_content_length(self):
+        "Only the leading MIME_SNIFF_SIZE bytes of a large first chunk are sniffed"
+        content = b'FAKE,FAKE\n' * MIME_SNIFF_SIZE
+
+        with patch('openaddr.cache.get_buffer_mimetype') as get_buffer_mimetype:
+            get_buffer_mimetype.return_value = 'text/csv'
+            self.assertEqual(guess_content_file_extension('http://example.com/data', dict(), content), '.csv')
+
+        get_buffer_mimetype.assert_called_once_with(content[:MIME_SNIFF_SIZE])
+
 class TestCacheEsriDownload (unittest.TestCase):
 
     def setUp(self):
@@ -355,3 +456,12 @@ class TestCacheEsriDownload (unittest.TestCase):
                 self.assertEqual(len(all_data),  5)
                 self.assertTrue('oa:geom' in all_data[0])
                 self.assertEqual(all_data[0]['oa:geom'], 'POINT (-86.82960553 34.18671398)')
+
+    def test_geometry_wkt(self):
+        '''
+        '''
+        self.assertEqual(geometry_wkt({'type': 'Point', 'coordinates': [-86.82960553, 34.18671398]}), 'POINT (-86.82960553 34.18671398)')
+        self.assertEqual(geometry_wkt({'type': 'Point', 'coordinates': [1, 2, 3]}), 'POINT Z (1 2 3)')
+        self.assertEqual(geometry_wkt({'type': 'LineString', 'coordinates': [[1, 2], [3, 4]]}), 'LINESTRING (1 2, 3 4)')
+        self.assertEqual(geometry_wkt({'type': 'Point', 'coordinates': [float('nan'), 2]}), shape({'type': 'Point', 'coordinates': [float('nan'), 2]}).wkt)
+        self.assertEqual(geometry_wkt({'type': 'Point', 'coordinates': [True, 34.5]}), shape({'type': 'Point', 'coordinates': [True, 34.5]}).wkt)
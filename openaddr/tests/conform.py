@@ -9,6 +9,7 @@ import csv
 import re
 
 import unittest
+from unittest import mock
 import tempfile
 import shutil
 
@@ -25,7 +26,9 @@ from ..conform import (
     row_fxn_first_non_empty, row_fxn_constant,
     row_canonicalize_unit_and_number, conform_cli,
     convert_regexp_replace, normalize_ogr_filename_case,
-    is_in, geojson_source_to_csv, check_source_tests
+    is_in, geojson_source_to_csv, geojson_point_geometry, check_source_tests,
+    transform_to_out_geojson, wkt_geometry_mapping, row_hash_json, conform_steps,
+    PointBatchWriter, conform_processes,
     )
 
 " Return an x,y array given a wkt point string"
@@ -72,6 +75,42 @@ class TestConformTransforms (unittest.TestCase):
             }
         }, r)
 
+    def test_wkt_geometry_mapping(self):
+        self.assertEqual(wkt_geometry_mapping('POINT (-119.2 39.3)'),
+                         {"type": "Point", "coordinates": (-119.2, 39.3)})
+        self.assertEqual(wkt_geometry_mapping('POINT (1 2 3)'),
+                         {"type": "Point", "coordinates": (1.0, 2.0, 3.0)})
+        self.assertEqual(wkt_geometry_mapping('LINESTRING (0 0, 1 1)'),
+                         {"type": "LineString", "coordinates": ((0.0, 0.0), (1.0, 1.0))})
+
+    def test_row_hash_json(self):
+        "Hashed JSON must match json.dumps byte for byte, or every oa:hash changes"
+        for items in (
+            [('n', '123'), ('s', 'MAPLE ST')],
+            [('n', None), ('s', 'RUE DE L\u2019\u00c9GLISE')],
+            [('n', '12\x7f'), ('s', 'TAB\tQUOTE"')],
+            [('n', 123), ('x', 1.5e16), ('y', True)],
+        ):
+            expected = json.dumps(items, separators=(',', ':')).encode('utf8')
+            self.assertEqual(row_hash_json(items), expected)
+
+    def test_point_batch_writer(self):
+        "Rows keep their order, and points PROJ rejects go to the fallback"
+        coord_transform = mock.Mock()
+        coord_transform.TransformPoints.side_effect = RuntimeError('failed')
+        writer = mock.Mock()
+
+        batch = PointBatchWriter(writer, coord_transform, lambda key: 'POINT ({} {})'.format(*key), (0, 2))
+        batch.writerow([None, 'a', None], (1, 2), (1, 2))
+        batch.writerow(['POINT (3 4)', 'b', 'POINT (3 4)'])
+        batch.flush()
+
+        coord_transform.TransformPoints.assert_called_once_with([(1, 2)])
+        self.assertEqual(writer.writerow.call_args_list, [
+            mock.call(['POINT (1 2)', 'a', 'POINT (1 2)']),
+            mock.call(['POINT (3 4)', 'b', 'POINT (3 4)']),
+        ])
+
     def test_row_merge(self):
         d = SourceConfig(dict({
             "schema": 2,
@@ -384,6 +423,10 @@ class TestConformTransforms (unittest.TestCase):
             }
         }, r)
 
+        steps = conform_steps(d)
+        self.assertEqual(len(steps), 1)
+        self.assertEqual(r, row_transform_and_convert(d, { "n": "123", "s1": "MAPLE", "s2": "ST", "oa:geom": "POINT (-119.2 39.3)"}, steps))
+
         d = SourceConfig(dict({
             "schema": 2,
             "layers": {
@@ -2177,6 +2220,68 @@ class TestConformMisc(unittest.TestCase):
             self.assertEqual(row[GEOM_FIELDNAME], 'POINT (-74.9833483425103 40.05498715)')
             self.assertEqual(row['PARCEL_NUM'], '02-022-003')
 
+    def test_transform_to_out_geojson_batches(self):
+        c = SourceConfig(dict({
+            "schema": 2,
+            "layers": {
+                "addresses": [{
+                    "name": "default",
+                    "conform": {"number": "n", "street": "s"}
+                }]
+            }
+        }), "addresses", "default")
+
+        extract_path = os.path.join(self.testdir, 'extract.csv')
+        geojson_path = os.path.join(self.testdir, 'out.geojson')
+
+        with open(extract_path, 'w', encoding='utf-8', newline='') as file:
+            rows = csv.writer(file)
+            rows.writerow(['n', 's', GEOM_FIELDNAME])
+            for number in range(10):
+                rows.writerow([str(number), 'MAPLE ST', 'POINT (-122 37)'])
+
+        # Conform rules are applied inline unless processes are configured
+        with mock.patch('openaddr.conform.CONFORM_BATCH_SIZE', 1), \
+             mock.patch.dict(os.environ, clear=True), \
+             mock.patch('openaddr.conform.ProcessPoolExecutor') as executor:
+            transform_to_out_geojson(c, extract_path, geojson_path)
+
+        executor.assert_not_called()
+
+        with open(geojson_path, encoding='utf-8') as file:
+            features = [json.loads(line) for line in file]
+
+        self.assertEqual([f['properties']['number'] for f in features], [str(n) for n in range(10)])
+
+        # One row per batch sends the extract through worker processes
+        with mock.patch('openaddr.conform.CONFORM_BATCH_SIZE', 1):
+            transform_to_out_geojson(c, extract_path, geojson_path, processes=2)
+
+        with open(geojson_path, encoding='utf-8') as file:
+            features = [json.loads(line) for line in file]
+
+        self.assertEqual([f['properties']['number'] for f in features], [str(n) for n in range(10)])
+        self.assertEqual(features[0]['geometry'], {'type': 'Point', 'coordinates': [-122, 37]})
+
+    def test_conform_processes(self):
+        with mock.patch('os.cpu_count', return_value=4):
+            for (value, expected) in (('', 1), ('auto', 4), ('2', 2), ('16', 4), ('0', 1), ('many', 1)):
+                with mock.patch.dict(os.environ, {'OPENADDR_CONFORM_PROCESSES': value}):
+                    self.assertEqual(conform_processes(), expected, value)
+
+    def test_geojson_point_geometry(self):
+        geom = geojson_point_geometry({'type': 'Point', 'coordinates': [-122, 37.5]})
+        self.assertEqual(geom.ExportToWkt(), 'POINT (-122 37.5)')
+
+        self.assertIsNone(geojson_point_geometry({'type': 'Point', 'coordinates': [-122, 37.5, 10]}))
+        self.assertIsNone(geojson_point_geometry({'type': 'Point', 'coordinates': []}))
+        self.assertIsNone(geojson_point_geometry({'type': 'LineString', 'coordinates': [[0, 0], [1, 1]]}))
+
+        # Non-numeric coordinates are left for OGR to reject
+        self.assertIsNone(geojson_point_geometry({'type': 'Point', 'coordinates': ['-122', '37.5']}))
+        self.assertIsNone(geojson_point_geometry({'type': 'Point', 'coordinates': [True, 37.5]}))
+        self.assertIsNone(geojson_point_geometry({'type': 'Point', 'coordinates': [-122, None]}))
+
 class TestConformCsv(unittest.TestCase):
     "Fixture to create real files to test csv_source_to_csv()"
 
@@ -2322,6 +2427,17 @@ class TestConformCsv(unittest.TestCase):
         self.assertEqual(self._ascii_header_out, r[0])
         self.assertEqual(self._ascii_row_out, r[1])
 
+    def test_too_few_columns(self):
+        "Check that rows missing their coordinate columns get an empty geometry"
+        c = { "conform": { "format": "csv", "lat": "LATITUDE", "lon": "LONGITUDE" }, 'protocol': 'test' }
+        d = (self._ascii_header_in.encode('ascii'),
+             self._ascii_row_in.encode('ascii'),
+             u'MAPLE ST,123'.encode('ascii'))
+        r = self._convert(c, d)
+        self.assertEqual(3, len(r))
+        self.assertEqual(self._ascii_row_out, r[1])
+        self.assertEqual(u'MAPLE ST,123,', r[2])
+
     def test_esri_csv(self):
         # Test that our ESRI-emitted CSV is converted correctly.
         c = { "protocol": "ESRI", "conform": { "format": "geojson", "lat": "theseare", "lon": "ignored" } }
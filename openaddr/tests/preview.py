@@ -10,6 +10,7 @@ from os.path import join, dirname
 from shutil import rmtree
 
 from httmock import HTTMock, response
+import mapbox_vector_tile
 
 from .. import preview
 
@@ -36,9 +37,9 @@ class TestPreview (unittest.TestCase):
                     }
                 }) + '\n')
 
-        xmean, xsdev, ymean, ysdev = preview.stats(points_filename)
-        self.assertAlmostEqual(xmean, -11966900.920021897)
-        self.assertAlmostEqual(xsdev, 32151.232557143696)
+        xmean, xsdev, ymean, ysdev = preview.stats(preview.read_surface_points(points_filename))
+        self.assertAlmostEqual(xmean, -11966900.920022305)
+        self.assertAlmostEqual(xsdev, 32151.23255737923)
 
     def test_calculate_bounds(self):
         points = [(-108 + (n * 0.001), -37 + (n * 0.001)) for n in range(0, 1000)]
@@ -57,7 +58,7 @@ class TestPreview (unittest.TestCase):
                     }
                 }) + '\n')
 
-        bbox = preview.calculate_bounds(points_filename)
+        bbox = preview.calculate_bounds(preview.read_surface_points(points_filename))
         self.assertEqual(bbox, (-12024729.169099594, -4441873.743568107, -11909072.670945017, -4297992.015057018), 'The two outliers are ignored')
 
     def test_render_geojson(self):
@@ -111,3 +112,40 @@ class TestPreview (unittest.TestCase):
         self.assertEqual(len(landuse_geoms), 230, 'Should have 230 landuse geometries')
         self.assertEqual(len(water_geoms), 9, 'Should have 9 water geometry')
         self.assertEqual(len(roads_geoms), 44, 'Should have 44 road geometries')
+
+    def test_filter_tile_layers(self):
+        '''
+        '''
+        with open(join(dirname(__file__), 'data', 'protomaps-tile-7-20-49.mvt'), 'rb') as file:
+            data = file.read()
+
+        tile = mapbox_vector_tile.decode(data)
+        filtered = mapbox_vector_tile.decode(preview.filter_tile_layers(data, preview.TILE_LAYERS))
+
+        self.assertEqual(set(filtered.keys()), {'landuse', 'water', 'roads'})
+        self.assertEqual(filtered, {name: tile[name] for name in filtered})
+
+    def test_get_map_features_tile_cache(self):
+        '''
+        '''
+        def response_content(url, request):
+            if url.hostname == 'api.protomaps.com' and url.path.startswith('/tiles/v4'):
+                with open(join(dirname(__file__), 'data', 'protomaps-tile-7-20-49.mvt'), 'rb') as file:
+                    data = file.read()
+                return response(200, data, headers={'Content-Type': 'application/vnd.mapbox-vector-tile'})
+            raise Exception("Unknown URL")
+
+        def no_response(url, request):
+            raise Exception("Tile should have come from cache")
+
+        xmin, ymin, xmax, ymax = -13611952, 4551290, -13609564, 4553048
+        scale = 100 / (xmax - xmin)
+
+        with HTTMock(response_content):
+            features1 = preview.get_map_features(xmin, ymin, xmax, ymax, 2, scale, 'protomaps-XXXX', self.temp_dir)
+
+        with HTTMock(no_response):
+            features2 = preview.get_map_features(xmin, ymin, xmax, ymax, 2, scale, 'protomaps-XXXX', self.temp_dir)
+
+        self.assertEqual([len(geoms) for geoms in features1], [230, 9, 44])
+        self.assertEqual([len(geoms) for geoms in features2], [230, 9, 44])
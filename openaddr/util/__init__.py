@@ -6,6 +6,7 @@ from os.path import join, basename, splitext, dirname, exists
 from operator import attrgetter
 from tempfile import mkstemp
 from os import close, getpid
+import os
 import glob
 import collections
 import ftplib
@@ -48,6 +49,24 @@ def request_ftp_file(url):
     # Using mock response because HTTP responses are expected downstream
     return httmock.response(200, file.read(), headers={'Content-Type': 'application/octet-stream'})
 
+def prefetch_file(path):
+    ''' Ask the kernel to start reading a file into the page cache.
+
+        Only fills the page cache ahead of the decompressor or OGR opening
+        the file; does nothing where posix_fadvise() is missing.
+    '''
+    if not hasattr(os, 'posix_fadvise'):
+        return
+
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        _L.debug('Could not advise kernel about {}: {}'.format(path, e))
+
 def get_pidlist(start_pid):
     ''' Return a set of recursively-found child PIDs of the given start PID.
     '''
@@ -36,7 +36,7 @@ setup(
     install_requires = [
         'gdal == 3.7.1',
 
-        'dateutils == 0.6.12', 'ijson == 2.4',
+        'ijson == 2.4',
 
         # https://github.com/uri-templates/uritemplate-py/
         'uritemplate == 4.1.1',
@@ -53,6 +53,9 @@ setup(
         # Used in openaddr.parcels
         'Shapely == 2.0.1',
 
+        # Used in openaddr.preview, already required by Shapely
+        'numpy < 2',
+
         # https://github.com/tilezen/mapbox-vector-tile
         'mapbox-vector-tile == 2.0.1',
         'future==0.18.3',
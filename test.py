@@ -14,7 +14,7 @@ import sys, os
 import logging
 
 from openaddr.tests import TestOA, TestState
-from openaddr.tests.cache import TestCacheExtensionGuessing, TestCacheEsriDownload
+from openaddr.tests.cache import TestCacheFingerprint, TestCacheURLDownload, TestCacheExtensionGuessing, TestCacheEsriDownload
 from openaddr.tests.conform import TestConformCli, TestConformTransforms, TestConformMisc, TestConformCsv, TestConformTests
 from openaddr.tests.preview import TestPreview
 from openaddr.tests.slippymap import TestSlippyMap